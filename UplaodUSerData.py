@@ -2,32 +2,50 @@ import streamlit as st
 import pandas as pd
 import sqlite3
 import io
+from excel_ingest import ingest_workbook, ingest_workbook_parallel
 
 st.title("📥 Excel to SQLite Table Uploader")
 
 # Upload Excel file
 uploaded_file = st.file_uploader("Upload Excel File", type=["xlsx"])
+parallel_upload = st.checkbox("⚡ Parse sheets in parallel", help="Faster for workbooks with many sheets; uses more memory.")
 
-if uploaded_file:
-    # Read all sheets
-    excel_data = pd.read_excel(uploaded_file, sheet_name=None)
-
-    # Connect to SQLite DB
-    con = sqlite3.connect("uploaded_data.db")
-    cursor = con.cursor()
 
-    st.success(f"Loaded {len(excel_data)} sheets. Creating tables...")
+# Sanitize table name
+def table_name_for(sheet_name):
+    return sheet_name.strip().replace(" ", "_")
 
-    for sheet_name, df in excel_data.items():
-        # Sanitize table name
-        table_name = sheet_name.strip().replace(" ", "_")
 
-        # Create table
-        df.columns = [col.strip().replace(" ", "_") for col in df.columns]
-        df.to_sql(table_name, con, if_exists="replace", index=False)
-
-        st.write(f"✅ Table created: `{table_name}` ({len(df)} rows)")
-        st.dataframe(df.head())
+if uploaded_file:
+    # Connect to SQLite DB
+    con = sqlite3.connect("uploaded_data.db")
+    sheet_progress = {}
+
+    def show_progress(table, rows, total=None):
+        if table not in sheet_progress:
+            sheet_progress[table] = st.empty()
+        if total:
+            sheet_progress[table].progress(min(rows / total, 1.0), text=f"⏳ `{table}`: {rows:,}/{total:,} rows")
+        else:
+            sheet_progress[table].write(f"⏳ `{table}`: {rows:,} rows written")
+
+    # Stream all sheets into tables (sanitized names and columns), one transaction for the workbook
+    ingest = ingest_workbook_parallel if parallel_upload else ingest_workbook
+    loaded = ingest(
+        uploaded_file, con,
+        detect_dates=False,
+        clean_columns=True,
+        table_namer=table_name_for,
+        on_progress=show_progress,
+    )
+    for placeholder in sheet_progress.values():
+        placeholder.empty()
+
+    st.success(f"Loaded {len(loaded)} sheets.")
+
+    for table_name, row_count, columns, preview, _ in loaded:
+        st.write(f"✅ Table created: `{table_name}` ({row_count} rows)")
+        st.dataframe(pd.DataFrame(preview, columns=columns))
 
     con.close()
     st.success("All tables created and data inserted successfully!")
@@ -31,6 +31,10 @@ CREATE TABLE Impairments (
     FOREIGN KEY (LoanID) REFERENCES Loans(LoanID)
 );
 
+-- Indexes on the foreign keys used by the joins
+CREATE INDEX IF NOT EXISTS ix_loans_customerid ON Loans (CustomerID);
+CREATE INDEX IF NOT EXISTS ix_impairments_loanid ON Impairments (LoanID);
+
 
 
 
@@ -1,15 +1,24 @@
 import streamlit as st
-import sqlite3
-import json
 import os
 import openai
 import logging
-import io
-import matplotlib.pyplot as plt
-import pandas as pd
 
 from dotenv import load_dotenv
-from openai import AzureOpenAI
+from llm_service import get_service
+from sql_extract import extract_sql
+from sql_validate import repair_messages, validate_sql
+from query_guard import QueryGuardError
+from schema_cache import catalog_from_ddl
+from schema_context import build_schema_context
+from sql_cache import lookup_sql, store_sql
+from question_match import find_similar_sql
+from db_pool import get_pool
+from result_pager import ResultPager
+from chart_planner import chart_data
+from chart_service import CHART_TYPES, cached_chart, chart_frame
+from result_export import FORMATS, available_formats, cached_export, export_file_name, export_mime, export_result, result_hash
+from index_advisor import record_query
+from query_log import log_query, timed
 
 
 
@@ -31,21 +40,22 @@ logger.info("Starting the NLP to SQL App")
 # Set up the OpenAI client
 
 try:
-    client = AzureOpenAI(
-    azure_endpoint=EndPoint_URL,
-    api_key=EndPoint_KEY,
-    api_version='2024-12-01-preview',
-)
+    llm = get_service(EndPoint_URL, EndPoint_KEY)
 except Exception as e:
     print(f"Error initializing AzureOpenAI client: {e}")
     st.error(f"Error initializing AzureOpenAI client: {e}")
     exit()
 
 
-with open('databaseMetaData.sql', 'r') as file:
-    db_file = file.read().replace('\n', '')
+# Schema context pruning: top-k relevant tables (plus FK neighbours) under a token budget
+SchemaTopK = int(os.getenv("SchemaTopK", "5"))
+SchemaTokenBudget = int(os.getenv("SchemaTokenBudget", "1500"))
 
-context = f'''Generate a SQL query ready to run 
+metadata_con, metadata_catalog = catalog_from_ddl('databaseMetaData.sql')
+
+def build_context(question):
+    db_file = build_schema_context(metadata_con, question, top_k=SchemaTopK, token_budget=SchemaTokenBudget, catalog=metadata_catalog)
+    return f'''Generate a SQL query ready to run 
 on sqlite database based on the 
 following database metadata{db_file}
 that will be used to answer the user question.
@@ -56,7 +66,8 @@ Answer with a SQL query only.
 st.title("NLP to SQL App")
 
 try:
-    con = sqlite3.connect('database.db')
+    # shared WAL pool; read connections are checked out per use and handed back
+    pool = get_pool('database.db')
 except:
     print("Error connecting to the database. Please check if the database file exists.")
     st.error("Error connecting to the database. Please check if the database file exists.")
@@ -73,62 +84,86 @@ with st.form(key='NLP input form'):
             st.error("Please enter a valid  natural language.")
             exit()
 
-    try:
-        completion = client.chat.completions.create(
-    model=DeploymentName,  # Use your deployment name as the model
-    messages=[
-        {
-            "role": "system",
-            "content": context
-        },
-        {
-            "role": "user",
-            "content": user_input
-        }
-    ],
-    temperature=0.5,
-    max_tokens=1000,
-)
-
-
-        # completion = client.chat.completions.create(
-        #       messages=[{
-        #                 "role": "system",
-        #                 "content": context
-        #             },
-        #             {   
-        #                 "role": "user",
-        #                 "content": user_input
-
-        #             }
-        #         ],
-        #         temperature=0.5,
-        #         max_tokens=1000,
-        #         deployment_id=DeploymentName,
-        #     )
-
-    except Exception as e:
-        print(f"Error generating SQL query:or while sending request to open AI {e}")
-        st.error(f"Error generating SQL query: {e}")
-        exit()
-
-    answer = json.loads(completion.to_json())
+    # latency per stage (ms) for the structured query log
+    stages = {}
+    with timed(stages, "lookup"):
+        context = build_context(user_input)
+        query = lookup_sql('database.db', user_input, context, DeploymentName)
+        from_cache = query is not None
+        source = "cache"
+        if not from_cache:
+            with pool.reader() as con:
+                query, similarity = find_similar_sql('database.db', con, user_input, DeploymentName)
+            source = "similar" if query is not None else "llm"
+    if query is not None:
+        Message = query
+    else:
+        try:
+            # streamed; generation stops once the first SQL statement is complete
+            with timed(stages, "generate"):
+                Message = llm.generate_sql(
+                    DeploymentName,  # Use your deployment name as the model
+                    [
+                        {"role": "system", "content": context},
+                        {"role": "user", "content": user_input},
+                    ],
+                    temperature=0.5,
+                    max_tokens=1000,
+                )
+        except Exception as e:
+            print(f"Error generating SQL query:or while sending request to open AI {e}")
+            st.error(f"Error generating SQL query: {e}")
+            log_query(user_input, None, stages, source=source, error=e, app="UserInputpage")
+            exit()
 
-#Preprocess the answer to get the SQL query
-    Message = answer['choices'][0]['message']['content']
-    selectPos = Message.upper().find("SELECT")
-    # semicolonPos = Message.selectPos.find(";") + selectPos
-    semicolonPos = Message[selectPos:].find(";") + selectPos
-    query= Message[selectPos:semicolonPos+1]
+        #Preprocess the answer to get the SQL query
+        query = extract_sql(Message)
 
-    if len(query) == 0:
+    if not query:
         st.error("Error: No SQL query generated.try rephasing your question.")
+        log_query(user_input, None, stages, source=source, error="no SQL generated", app="UserInputpage")
+        exit()
+
+    # Validate locally (read-only, identifiers against the schema); one repair prompt with the exact error
+    with timed(stages, "validate"):
+        with pool.reader() as con:
+            validation_error = validate_sql(con, query)
+        if validation_error:
+            logger.warning(f"SQL validation failed: {validation_error}")
+            query = extract_sql(llm.generate_sql(
+                DeploymentName,
+                repair_messages(context, user_input, query, validation_error),
+                temperature=0,
+                max_tokens=1000,
+            ))
+            with pool.reader() as con:
+                validation_error = validate_sql(con, query)
+            logger.info(f"SQL repair {'failed' if validation_error else 'succeeded'}")
+            from_cache = False
+    if validation_error:
+        st.error(f"Error: the generated SQL does not fit the database ({validation_error}). Try rephrasing your question.")
+        log_query(user_input, query, stages, source=source, error=validation_error, app="UserInputpage")
         exit()
     try:
-        result = con.execute(query)
-        resultSet= result.fetchall()
-    except :
+        # read-only connection, time limit, row cap and cross-product refusal
+        # the pager reads one page per rerun, each on a pooled read connection
+        pager = st.session_state.get('pager')
+        new_query = pager is None or pager.sql != query.strip().rstrip(";")
+        if new_query:
+            if pager is not None:
+                pager.close()
+            pager = ResultPager(pool, query)
+            st.session_state['pager'] = pager
+        with timed(stages, "execute"):
+            pager.page(0)
+        record_query('database.db', query)
+    except QueryGuardError as e:
+        st.error(f"Error: {e}")
+        log_query(user_input, query, stages, cache_hit=from_cache, source=source, error=e, app="UserInputpage")
+        exit()
+    except Exception as e:
         st.error("Error executing the SQL query. Please check the query syntax.")
+        log_query(user_input, query, stages, cache_hit=from_cache, source=source, error=e, app="UserInputpage")
         exit()
 
     
@@ -145,26 +180,43 @@ with st.form(key='NLP input form'):
     with st.expander("SQL Query"):
         st.write('The query generated is:')
         st.code(query)
+    if not from_cache:
+        store_sql('database.db', user_input, context, DeploymentName, query)
 
-column_names = [item[0] for item in result.description]
-df = pd.DataFrame(resultSet, columns=column_names)
 
 st.write("Result:")
-st.dataframe(df, use_container_width=True)
-
-csv_data = df.to_csv(index=False).encode('utf-8')
-st.download_button("📥 Download Result as CSV", data=csv_data, file_name="query_result.csv", mime='text/csv')
-
-excel_buffer = io.BytesIO()
-df.to_excel(excel_buffer, index=False, engine='xlsxwriter')
-st.download_button("📥 Download Result as Excel", data=excel_buffer, file_name="query_result.xlsx", mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-
-logger.info("User input: %s", user_input)
-logger.info("Message from API/Answer from API: %s", Message)
-logger.info("Generated SQL query: %s", query)
-logger.info("Query result: %s", resultSet)
-logger.info(f'Description of the result: {result.description}')
-logger.info("Execution completed successfully.")
+pages = pager.page_count()
+page = 1
+if pages != 1:
+    page = st.number_input("Page", min_value=1, max_value=pages, value=1, step=1, key=f"page_{hash(pager.sql)}")
+total = pager.total_rows()
+st.caption(f"{total:,} rows in total." if total is not None else "Row count unavailable (counting timed out).")
+if total is not None and total > pager.row_cap:
+    st.caption(f"Showing and exporting the first {pager.row_cap:,} rows.")
+try:
+    st.dataframe(pager.page(page - 1), use_container_width=True)
+except QueryGuardError as e:
+    st.error(f"Error: {e}")
+
+# downloads are built only when asked for, streamed from the cursor and cached per result
+export_format = st.selectbox("Export format", available_formats(), format_func=lambda fmt: FORMATS[fmt][0])
+export_key = result_hash(pager.pool, query)
+export_data = cached_export(export_key, export_format)
+if export_data is None and st.button("Prepare download"):
+    try:
+        export_data = export_result(pager.pool, query, export_format, key=export_key)
+    except QueryGuardError as e:
+        st.warning(f"Export stopped: {e}")
+    except Exception as e:
+        logger.error(f"Export error ({export_format}): {e}")
+        st.error(f"Could not build the {FORMATS[export_format][0]} export: {e}")
+if export_data is not None:
+    st.download_button(f"📥 Download Result as {FORMATS[export_format][0]}", data=export_data, file_name=export_file_name("query_result", export_format), mime=export_mime(export_format))
+
+# one query log entry per query run, not per rerun
+if new_query:
+    log_query(user_input, query, stages, row_count=total, cache_hit=from_cache, source=source,
+              app="UserInputpage", result=lambda: pager.page(0))
 # Close the database connection
 
 
@@ -183,45 +235,25 @@ logger.info("Execution completed successfully.")
 #     if pd.api.types.is_numeric_dtype(df[value_col]):
 #         st.bar_chart(df.set_index(label_col))
 
-chart_type = st.selectbox("Select chart type", ["None", "Bar", "Line", "Area"])
-
-if df.shape[1] == 2:
-    label_col, value_col = df.columns[0], df.columns[1]
-    if pd.api.types.is_numeric_dtype(df[value_col]):
-        chart_df = df.set_index(label_col)
-        if chart_type == "Bar":
-            st.bar_chart(chart_df)
-        elif chart_type == "Line":
-            st.line_chart(chart_df)
-        elif chart_type == "Area":
-            st.area_chart(chart_df)
-
-
-
-
-if df.shape[1] == 2:
-    label_col, value_col = df.columns[0], df.columns[1]
-    if pd.api.types.is_numeric_dtype(df[value_col]):
-        chart_df = df.set_index(label_col)
-
-        fig, ax = plt.subplots()
-        if chart_type == "Bar":
-            chart_df.plot(kind='bar', ax=ax, legend=False)
-        elif chart_type == "Line":
-            chart_df.plot(kind='line', ax=ax, legend=False)
-        elif chart_type == "Area":
-            chart_df.plot(kind='area', ax=ax, legend=False)
+chart_type = st.selectbox("Select chart type", CHART_TYPES)
 
-        st.pyplot(fig)
-
-        # Save figure to buffer
-        img_buf = io.BytesIO()
-        fig.savefig(img_buf, format='png')
-        img_buf.seek(0)
-
-        st.download_button("📸 Download Chart as PNG", data=img_buf, file_name="chart.png", mime="image/png")
-
-
-
-
-con.close()
\ No newline at end of file
+# charts plot the result aggregated in SQLite to a bounded number of points
+chart_df = None
+if len(pager.columns) == 2 and chart_type != "None":
+    try:
+        chart_df = chart_data(pager.pool, query, key=result_hash(pager.pool, query))
+    except QueryGuardError as e:
+        st.warning(f"Chart skipped: {e}")
+planned = chart_frame(chart_df) if chart_df is not None else None
+if planned is not None:
+    if chart_type == "Bar":
+        st.bar_chart(planned[0])
+    elif chart_type == "Line":
+        st.line_chart(planned[0])
+    elif chart_type == "Area":
+        st.area_chart(planned[0])
+
+    # PNG drawn once per result and chart type, then served from cache
+    img = cached_chart(result_hash(pager.pool, query), chart_type, lambda: chart_df)
+    st.image(img)
+    st.download_button("📸 Download Chart as PNG", data=img, file_name="chart.png", mime="image/png")
@@ -0,0 +1,58 @@
+import threading
+from collections import OrderedDict
+
+# Thread-safe LRU used by the per-process caches (query results, exports,
+# charts, table styles, workbook views), bounded by entry count and/or the
+# total size of its values. Values larger than max_bytes are not kept.
+# stats counts lookup hits and misses and the bytes currently held.
+
+
+class BoundedCache:
+    def __init__(self, max_entries=None, max_bytes=None, size=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._size = size or (lambda value: 0)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self.stats = {"hits": 0, "misses": 0, "bytes": 0}
+
+    # (True, value) for a cached key, (False, None) otherwise; None is a valid value
+    def lookup(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return True, self._entries[key]
+            self.stats["misses"] += 1
+        return False, None
+
+    def get(self, key, default=None):
+        found, value = self.lookup(key)
+        return value if found else default
+
+    def put(self, key, value):
+        size = self._size(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.stats["bytes"] -= self._sizes[key]
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._sizes[key] = size
+            self.stats["bytes"] += size
+            while self._entries and (
+                (self.max_entries is not None and len(self._entries) > self.max_entries)
+                or (self.max_bytes is not None and self.stats["bytes"] > self.max_bytes)
+            ):
+                evicted, _ = self._entries.popitem(last=False)
+                self.stats["bytes"] -= self._sizes.pop(evicted)
+
+    # Cached value for key; on a miss build() runs outside the lock and its result is kept
+    def get_or_build(self, key, build):
+        found, value = self.lookup(key)
+        if not found:
+            value = build()
+            self.put(key, value)
+        return value
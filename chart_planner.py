@@ -0,0 +1,127 @@
+import os
+import re
+
+import pandas as pd
+
+from bounded_cache import BoundedCache
+from query_guard import QUERY_TIMEOUT, time_limit
+
+# Chart aggregation in SQLite: the result query is wrapped in a GROUP BY so a
+# chart gets a bounded number of points.
+#   Category + Value            -> one row per category / x bucket
+#   Category, Time, Value       -> one row per (series, x bucket)
+# y is always the SUM per x value or bucket: x values with more than
+# ChartMaxBuckets distinct values are grouped into equal-width numeric / date
+# ranges, or for text into the top categories plus "Other". At most
+# ChartMaxSeries series are kept, the rest become "Other".
+
+MAX_BUCKETS = int(os.getenv("ChartMaxBuckets", "200"))
+MAX_SERIES = int(os.getenv("ChartMaxSeries", "8"))
+OTHER = "Other"
+SAMPLE_ROWS = 500
+MAX_CACHED_FRAMES = 32
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+_frames = BoundedCache(max_entries=MAX_CACHED_FRAMES)
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+# Values of column with the largest SUM(value), most first
+def _top_values(con, rows, column, value, limit):
+    statement = f"{rows}SELECT {column} FROM _chart_rows GROUP BY {column} ORDER BY SUM({value}) DESC LIMIT {int(limit)}"
+    return [row[0] for row in con.execute(statement).fetchall()]
+
+
+def _top_or_other(column, values):
+    return f"CASE WHEN {column} IN ({', '.join('?' * len(values))}) THEN {column} ELSE '{OTHER}' END"
+
+
+# Number of distinct values of column, counting stops past limit
+def _distinct(con, rows, column, limit):
+    statement = f"{rows}SELECT COUNT(*) FROM (SELECT DISTINCT {column} FROM _chart_rows LIMIT {int(limit) + 1})"
+    return con.execute(statement).fetchone()[0]
+
+
+# "numeric", "date" (ISO text, as julianday() reads it) or "text" for sampled values
+def _kind(values):
+    values = [value for value in values if value is not None]
+    if values and all(isinstance(value, (int, float)) for value in values):
+        return "numeric"
+    if values and all(isinstance(value, str) and _ISO_DATE.match(value) for value in values):
+        return "date"
+    return "text"
+
+
+# (aggregate SQL, parameters, x is a date) for a 2 or 3 column result whose last
+# column is numeric, None when the result cannot be charted. con is a read connection.
+# Every statement reads the result once, so SQLite streams it rather than
+# materializing it; column kinds come from a sample of the first rows.
+def plan_chart(con, sql, max_buckets=MAX_BUCKETS, max_series=MAX_SERIES):
+    rows = f"WITH _chart_rows AS ({sql.strip().rstrip(';')}) "
+    cursor = con.execute(rows + f"SELECT * FROM _chart_rows LIMIT {SAMPLE_ROWS}")
+    columns = [desc[0] for desc in cursor.description]
+    if len(columns) not in (2, 3):
+        return None
+    sample = cursor.fetchall()
+    if not sample or _kind([row[-1] for row in sample]) != "numeric":
+        return None
+    series = _quote(columns[0]) if len(columns) == 3 else None
+    x, y = _quote(columns[-2]), _quote(columns[-1])
+
+    params = []
+    date_axis = False
+    if _distinct(con, rows, x, max_buckets) <= max_buckets:
+        key, label = x, "_k"
+    elif _kind([row[-2] for row in sample]) != "text":
+        # equal-width ranges over numbers, or over julianday() for dates
+        date_axis = _kind([row[-2] for row in sample]) == "date"
+        position = f"julianday({x})" if date_axis else x
+        low, high = con.execute(rows + f"SELECT MIN({position}), MAX({position}) FROM _chart_rows").fetchone()
+        width = (high - low) / max_buckets or 1
+        key = f"MIN({max_buckets - 1}, CAST(({position} - {low!r}) / {width!r} AS INTEGER))"
+        label = f"datetime({low!r} + _k * {width!r})" if date_axis else f"{low!r} + _k * {width!r}"
+    else:
+        top = _top_values(con, rows, x, y, max_buckets - 1)
+        key, label = _top_or_other(x, top), "_k"
+        params += top
+
+    inner = [f"{key} AS _k", y]
+    select = [f"{label} AS {x}", f"SUM({y}) AS {y}"]
+    group = ["_k"]
+    if series:
+        if _distinct(con, rows, series, max_series) > max_series:
+            top = _top_values(con, rows, series, y, max_series - 1)
+            inner.insert(0, f"{_top_or_other(series, top)} AS _s")
+            params = top + params
+        else:
+            inner.insert(0, f"{series} AS _s")
+        select.insert(0, f"_s AS {series}")
+        group.insert(0, "_s")
+    statement = (
+        f"{rows}SELECT {', '.join(select)} FROM (SELECT {', '.join(inner)} FROM _chart_rows) "
+        f"GROUP BY {', '.join(group)} ORDER BY {', '.join(group)}"
+    )
+    return statement, params, date_axis
+
+
+# The chartable, aggregated form of a result (same columns, at most
+# ChartMaxBuckets x ChartMaxSeries rows), or None when it cannot be charted.
+# With a key (the result hash) the frame is kept for later reruns.
+def chart_data(pool, sql, timeout=QUERY_TIMEOUT, key=None):
+    if key is not None:
+        return _frames.get_or_build(key, lambda: chart_data(pool, sql, timeout))
+    with pool.reader() as con:
+        with time_limit(con, timeout):
+            planned = plan_chart(con, sql)
+            if planned is None:
+                return None
+            statement, params, date_axis = planned
+            cursor = con.execute(statement, params)
+            frame = pd.DataFrame(cursor.fetchall(), columns=[desc[0] for desc in cursor.description])
+    if date_axis:
+        x = frame.columns[-2]
+        frame[x] = pd.to_datetime(frame[x])
+    return frame
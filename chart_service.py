@@ -0,0 +1,123 @@
+import io
+import os
+
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.figure import Figure
+import numpy as np
+import pandas as pd
+
+from bounded_cache import BoundedCache
+
+try:
+    import seaborn as sns
+    sns.set_theme(style="whitegrid")  # once per process, not per render
+except ImportError:
+    sns = None
+
+# Chart rendering on standalone matplotlib Figures, with LTTB downsampling of
+# long line / area series. Image bytes are kept per (result hash, type, format).
+
+CHART_TYPES = ["None", "Bar", "Line", "Area"]
+MAX_POINTS = int(os.getenv("ChartMaxPoints", "2000"))
+MAX_CACHED_CHARTS = 64
+FIGSIZE = (10, 5)
+COLORS = {"Bar": "#4e79a7", "Line": "#f28e2b", "Area": "#59a14f"}
+
+_charts = BoundedCache(max_entries=MAX_CACHED_CHARTS)
+
+
+# Largest-Triangle-Three-Buckets: indices of at most threshold points that keep
+# the visual shape of the series (first and last point always kept)
+def lttb(x, y, threshold):
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.nan_to_num(np.asarray(y, dtype=float))
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            avg_x, avg_y = x[end:edges[i + 2]].mean(), y[end:edges[i + 2]].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def _positions(index):
+    # numeric or datetime x values as floats; anything else by row position
+    values = np.asarray(index)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype("datetime64[ns]").astype(np.int64).astype(float)
+    if np.issubdtype(values.dtype, np.number):
+        return values.astype(float)
+    return np.arange(len(values), dtype=float)
+
+
+# Keep at most max_points rows of a (x index) x (series columns) frame
+def downsample(frame, max_points=MAX_POINTS):
+    if len(frame) <= max_points:
+        return frame
+    x = _positions(frame.index)
+    per_series = max(3, max_points // max(1, frame.shape[1]))
+    keep = np.unique(np.concatenate([lttb(x, frame[col].to_numpy(), per_series) for col in frame.columns]))
+    return frame.iloc[keep]
+
+
+# (frame indexed by x with one column per series, x label, y label), or None
+# when the result is neither Category + Value nor Category, Time, Value
+def chart_frame(df):
+    if df.shape[1] == 2 and pd.api.types.is_numeric_dtype(df[df.columns[1]]):
+        return df.set_index(df.columns[0]), df.columns[0], df.columns[1]
+    if df.shape[1] == 3:
+        pivot_df = df.pivot(index=df.columns[1], columns=df.columns[0], values=df.columns[2])
+        return pivot_df.sort_index(), df.columns[1], df.columns[2]
+    return None
+
+
+# Image bytes of the chart, or None when the result cannot be charted
+def render_chart(df, chart_type, fmt="png"):
+    planned = chart_frame(df)
+    if planned is None:
+        return None
+    chart_df, x_label, y_label = planned
+    single = chart_df.shape[1] == 1
+    if chart_type in ("Line", "Area"):
+        chart_df = downsample(chart_df)
+    fig = Figure(figsize=FIGSIZE)
+    try:
+        ax = fig.subplots()
+        color = COLORS[chart_type] if single else None
+        if chart_type == "Bar":
+            chart_df.plot(kind='bar', ax=ax, legend=not single, stacked=not single, color=color)
+        elif chart_type == "Line":
+            chart_df.plot(kind='line', ax=ax, legend=not single, marker='o' if len(chart_df) <= 200 else None, color=color)
+        elif chart_type == "Area":
+            chart_df.plot(kind='area', ax=ax, legend=not single, color=color)
+        ax.set_title("Chart: " + str(y_label), fontsize=16)
+        ax.set_xlabel(str(x_label), fontsize=12)
+        ax.set_ylabel(str(y_label), fontsize=12)
+        ax.tick_params(axis="x", labelrotation=45)
+        fig.tight_layout()
+        out = io.BytesIO()
+        fig.savefig(out, format=fmt)
+        return out.getvalue()
+    finally:
+        fig.clear()
+
+
+# Chart for a result, drawn once per (result hash, chart type, format).
+# load_frame() (the rows to chart, None if there are none) is only called on a miss.
+def cached_chart(key, chart_type, load_frame, fmt="png"):
+    def build():
+        frame = load_frame()
+        return None if frame is None else render_chart(frame, chart_type, fmt)
+
+    return _charts.get_or_build((key, chart_type, fmt), build)
@@ -0,0 +1,281 @@
+import hashlib
+from datetime import date
+
+from result_cache import cached_query
+
+# Materialized dashboard aggregates.
+# Every sidebar dashboard is stored as a summary table (_mv_*) and read from
+# there, so opening one costs the size of its result rather than a scan of
+# Loans / Loan_Payments. Triggers on the source tables log the groups a write
+# touches (old and new values) into _mv_dirty; a refresh recomputes only those
+# groups. A source table that was dropped and recreated (replace upload) has
+# lost its triggers, which forces a full rebuild of the views that read it.
+#
+# Each view: sql with a {where} slot that restricts the aggregation to dirty
+# groups, the result column identifying a group and the matching SQL
+# expression, and per source table a SELECT giving the groups of a {row}.
+# When the group expression is computed (e.g. a month from a date), "range"
+# names an indexed source column and maps a group key to its [low, high)
+# bounds, so a refresh reads only the dirty ranges through that index.
+
+STATE_TABLE = "_mv_state"
+DIRTY_TABLE = "_mv_dirty"
+MAX_DIRTY_RANGES = 200  # more dirty groups than this refresh with one filtered scan
+
+
+# ISO date text bounds of a "YYYY-MM" month: ("2024-03-01", "2024-04-01")
+def _month_bounds(month):
+    year, number = (int(part) for part in month.split("-"))
+    first = date(year, number, 1)
+    following = date(year + number // 12, number % 12 + 1, 1)
+    return first.isoformat(), following.isoformat()
+
+DASHBOARDS = {
+    "Customer Loan Summary": {
+        "sql": """
+        SELECT
+        C.customer_id,
+        C.first_name || ' ' || C.last_name AS FullName,
+        COUNT(L.loan_id) AS TotalLoans,
+        SUM(L.loan_amount) AS TotalLoanAmount
+        FROM Customers C
+        JOIN Loans L ON C.customer_id = L.customer_id
+        {where}
+        GROUP BY C.customer_id, FullName
+        """,
+        "order": "TotalLoanAmount DESC",
+        "group": ("customer_id", "C.customer_id"),
+        "sources": {
+            "Customers": "SELECT {row}.customer_id",
+            "Loans": "SELECT {row}.customer_id",
+        },
+    },
+    "Impairment by Type": {
+        "sql": """
+        SELECT impairment_type, SUM(impairment_amount) AS total_impairment
+        FROM Loan_Impairments
+        {where}
+        GROUP BY impairment_type
+        """,
+        "order": "total_impairment DESC",
+        "group": ("impairment_type", "impairment_type"),
+        "sources": {
+            "Loan_Impairments": "SELECT {row}.impairment_type",
+        },
+    },
+    "Monthly Loan Payments": {
+        "sql": """
+        SELECT
+        strftime('%Y-%m', payment_date) AS Month,
+        SUM(payment_amount) AS TotalPayments
+        FROM Loan_Payments
+        {where}
+        GROUP BY Month
+        """,
+        "order": "Month",
+        "group": ("Month", "strftime('%Y-%m', payment_date)"),
+        "range": ("Loan_Payments", "payment_date", _month_bounds),
+        "sources": {
+            "Loan_Payments": "SELECT strftime('%Y-%m', {row}.payment_date)",
+        },
+    },
+    "Top 5 Customers by Loan Amount": {
+        "sql": """
+        SELECT
+        C.customer_id,
+        C.first_name || ' ' || C.last_name AS FullName,
+        SUM(L.loan_amount) AS TotalLoanAmount
+        FROM Customers C
+        JOIN Loans L ON C.customer_id = L.customer_id
+        {where}
+        GROUP BY C.customer_id, FullName
+        """,
+        "order": "TotalLoanAmount DESC",
+        "limit": 5,
+        "group": ("customer_id", "C.customer_id"),
+        "sources": {
+            "Customers": "SELECT {row}.customer_id",
+            "Loans": "SELECT {row}.customer_id",
+        },
+    },
+    "Loans with Impairments": {
+        "sql": """
+        SELECT
+        L.loan_id,
+        C.first_name || ' ' || C.last_name AS FullName,
+        L.loan_amount,
+        SUM(I.impairment_amount) AS TotalImpairment
+        FROM Loans L
+        JOIN Customers C ON L.customer_id = C.customer_id
+        JOIN Loan_Impairments I ON L.loan_id = I.loan_id
+        {where}
+        GROUP BY L.loan_id, FullName, L.loan_amount
+        """,
+        "order": "TotalImpairment DESC",
+        "group": ("loan_id", "L.loan_id"),
+        "sources": {
+            "Loans": "SELECT {row}.loan_id",
+            "Loan_Impairments": "SELECT {row}.loan_id",
+            "Customers": "SELECT loan_id FROM Loans WHERE customer_id = {row}.customer_id",
+        },
+    },
+}
+
+
+def _slug(name):
+    return "".join(char if char.isalnum() else "_" for char in name.lower())
+
+
+def view_table(name):
+    return f"_mv_{_slug(name)}"
+
+
+def _tail(view):
+    tail = f"\nORDER BY {view['order']}"
+    if view.get("limit"):
+        tail += f"\nLIMIT {view['limit']}"
+    return tail + ";"
+
+
+# The dashboard query computed from the base tables
+def dashboard_sql(name):
+    view = DASHBOARDS[name]
+    return view["sql"].format(where="").rstrip() + _tail(view)
+
+
+# The dashboard query read from its summary table
+def view_query(name):
+    return f'SELECT * FROM "{view_table(name)}"' + _tail(DASHBOARDS[name])
+
+
+def _definition_hash(name):
+    view = DASHBOARDS[name]
+    raw = view["sql"] + repr(view["group"]) + repr(sorted(view["sources"].items()))
+    if view.get("range"):
+        raw += repr(view["range"][:2])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _trigger_name(name, source, event):
+    return f"_mv_{_slug(name)}_{source.lower()}_{event}"
+
+
+def _exists(con, kind, name):
+    return con.execute("SELECT 1 FROM sqlite_master WHERE type = ? AND name = ?;", (kind, name)).fetchone() is not None
+
+
+def _ensure_state_tables(con):
+    con.execute(f"CREATE TABLE IF NOT EXISTS {STATE_TABLE} (view TEXT PRIMARY KEY, definition TEXT);")
+    con.execute(f"CREATE TABLE IF NOT EXISTS {DIRTY_TABLE} (view TEXT, group_key, UNIQUE (view, group_key));")
+
+
+# True when the summary table exists, matches its definition, its triggers are in
+# place and no groups are waiting to be recomputed
+def view_is_fresh(con, name):
+    if not (_exists(con, "table", STATE_TABLE) and _exists(con, "table", view_table(name))):
+        return False
+    state = con.execute(f"SELECT definition FROM {STATE_TABLE} WHERE view = ?;", (name,)).fetchone()
+    if not state or state[0] != _definition_hash(name):
+        return False
+    for source in DASHBOARDS[name]["sources"]:
+        if not _exists(con, "trigger", _trigger_name(name, source, "delete")):
+            return False
+    return con.execute(f"SELECT 1 FROM {DIRTY_TABLE} WHERE view = ? LIMIT 1;", (name,)).fetchone() is None
+
+
+def _install_triggers(con, name):
+    for source, groups in DASHBOARDS[name]["sources"].items():
+        log = f"INSERT OR IGNORE INTO {DIRTY_TABLE} (view, group_key) SELECT '{name}', * FROM ({{}});"
+        old = log.format(groups.format(row="OLD"))
+        new = log.format(groups.format(row="NEW"))
+        for event, body in (("insert", new), ("delete", old), ("update", old + "\n" + new)):
+            trigger = _trigger_name(name, source, event)
+            con.execute(f'DROP TRIGGER IF EXISTS "{trigger}";')
+            con.execute(f'CREATE TRIGGER "{trigger}" AFTER {event.upper()} ON "{source}" BEGIN\n{body}\nEND;')
+
+
+def _rebuild(con, name):
+    table = view_table(name)
+    view = DASHBOARDS[name]
+    con.execute(f'DROP TABLE IF EXISTS "{table}";')
+    con.execute(f'CREATE TABLE "{table}" AS {view["sql"].format(where="")};')
+    con.execute(f'CREATE INDEX "{table}_group" ON "{table}" ("{view["group"][0]}");')
+    if view.get("range"):
+        source, column, _ = view["range"]
+        con.execute(f'CREATE INDEX IF NOT EXISTS "{table}_{column.lower()}" ON "{source}" ("{column}");')
+    _install_triggers(con, name)
+    con.execute(f"DELETE FROM {DIRTY_TABLE} WHERE view = ?;", (name,))
+    con.execute(f"INSERT OR REPLACE INTO {STATE_TABLE} VALUES (?, ?);", (name, _definition_hash(name)))
+
+
+# Recompute the dirty groups only; returns how many groups were refreshed
+def _refresh_dirty(con, name):
+    dirty = con.execute(f"SELECT COUNT(*) FROM {DIRTY_TABLE} WHERE view = ?;", (name,)).fetchone()[0]
+    if not dirty:
+        return 0
+    table = view_table(name)
+    view = DASHBOARDS[name]
+    column, expression = view["group"]
+
+    def matches(expr):
+        return (
+            f"({expr} IN (SELECT group_key FROM {DIRTY_TABLE} WHERE view = :view) OR ({expr} IS NULL AND "
+            f"EXISTS (SELECT 1 FROM {DIRTY_TABLE} WHERE view = :view AND group_key IS NULL)))"
+        )
+
+    params = {"view": name}
+    source_filter = matches(expression)
+    keys = [row[0] for row in con.execute(f"SELECT group_key FROM {DIRTY_TABLE} WHERE view = ?;", (name,))]
+    if view.get("range") and None not in keys and len(keys) <= MAX_DIRTY_RANGES:
+        # one indexed range per dirty group, checked against the group expression
+        # (assumes ISO date text, as uploads store it)
+        _, range_column, bounds = view["range"]
+        ranges = []
+        try:
+            for position, key in enumerate(keys):
+                params[f"low{position}"], params[f"high{position}"] = bounds(key)
+                ranges.append(f"({range_column} >= :low{position} AND {range_column} < :high{position})")
+            source_filter = f"({' OR '.join(ranges)}) AND {source_filter}"
+        except (TypeError, ValueError):
+            pass  # a key that is not a month: filtered scan
+    con.execute(f'DELETE FROM "{table}" WHERE {matches(column)};', params)
+    con.execute(f'INSERT INTO "{table}" {view["sql"].format(where="WHERE " + source_filter)};', params)
+    con.execute(f"DELETE FROM {DIRTY_TABLE} WHERE view = ?;", (name,))
+    return dirty
+
+
+# Bring the summary tables up to date on a write connection (e.g. after an upload).
+# Returns {dashboard: "rebuilt" | "missing" | refreshed group count}.
+def refresh_views(con, names=None):
+    _ensure_state_tables(con)
+    refreshed = {}
+    for name in names or DASHBOARDS:
+        if not all(_exists(con, "table", source) for source in DASHBOARDS[name]["sources"]):
+            # a source table is gone: drop the stale summary so reads fail like the base query
+            con.execute(f'DROP TABLE IF EXISTS "{view_table(name)}";')
+            refreshed[name] = "missing"
+            continue
+        state = con.execute(f"SELECT definition FROM {STATE_TABLE} WHERE view = ?;", (name,)).fetchone()
+        stale = (
+            not _exists(con, "table", view_table(name))
+            or not state or state[0] != _definition_hash(name)
+            or not all(_exists(con, "trigger", _trigger_name(name, source, "delete"))
+                       for source in DASHBOARDS[name]["sources"])
+        )
+        if stale:
+            _rebuild(con, name)
+            refreshed[name] = "rebuilt"
+        else:
+            refreshed[name] = _refresh_dirty(con, name)
+    return refreshed
+
+
+# Dashboard frame from its summary table, refreshing it first if anything changed
+def read_dashboard(pool, db_path, name):
+    with pool.reader() as con:
+        fresh = view_is_fresh(con, name)
+    if not fresh:
+        with pool.writer() as con:
+            refresh_views(con, [name])
+    with pool.reader() as con:
+        return cached_query(con, db_path, view_query(name), token=pool.data_version())
@@ -0,0 +1,84 @@
+import os
+import queue
+import sqlite3
+import threading
+from urllib.request import pathname2url
+from contextlib import contextmanager
+
+# SQLite connection pool per database file: a few shared read connections and
+# one serialized writer, all in WAL mode so reads continue during a write.
+
+READ_CONNECTIONS = 4
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KIB = 64 * 1024
+MMAP_SIZE = 256 * 1024 * 1024
+
+_lock = threading.Lock()
+_pools = {}
+
+
+def _configure(con):
+    con.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS};")
+    con.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB};")
+    con.execute(f"PRAGMA mmap_size = {MMAP_SIZE};")
+    con.execute("PRAGMA temp_store = MEMORY;")
+    return con
+
+
+class ConnectionPool:
+    def __init__(self, path, read_connections=READ_CONNECTIONS):
+        self.path = path
+        # connections are handed between Streamlit script threads, but only ever
+        # used by one thread at a time (queue checkout / writer lock)
+        self._writer = _configure(sqlite3.connect(path, check_same_thread=False))
+        self._writer.execute("PRAGMA journal_mode = WAL;")
+        self._writer.execute("PRAGMA synchronous = NORMAL;")
+        self._writer_lock = threading.Lock()
+        self._readers = queue.Queue()
+        for _ in range(read_connections):
+            self._readers.put(self.connect_reader())
+        # never writes, so its data_version moves on every commit from any connection
+        self._monitor = sqlite3.connect(path, check_same_thread=False)
+        self._monitor_lock = threading.Lock()
+
+    # Readers open the file read-only (mode=ro URI), so generated SQL cannot write
+    def connect_reader(self):
+        uri = f"file:{pathname2url(os.path.abspath(self.path))}?mode=ro"
+        return _configure(sqlite3.connect(uri, uri=True, check_same_thread=False))
+
+    @contextmanager
+    def reader(self):
+        con = self._readers.get()
+        try:
+            yield con
+        finally:
+            if con.in_transaction:
+                con.rollback()
+            self._readers.put(con)
+
+    # Single writer: commits on success, rolls back on error
+    @contextmanager
+    def writer(self):
+        with self._writer_lock:
+            try:
+                yield self._writer
+                self._writer.commit()
+            except Exception:
+                self._writer.rollback()
+                raise
+
+    # Database-wide change counter (PRAGMA data_version of the idle monitor connection)
+    def data_version(self):
+        with self._monitor_lock:
+            return self._monitor.execute("PRAGMA data_version;").fetchone()[0]
+
+
+# Process-wide pool per database file
+def get_pool(path, read_connections=READ_CONNECTIONS):
+    with _lock:
+        pool = _pools.get(path)
+        if pool is None:
+            pool = ConnectionPool(path, read_connections)
+            _pools[path] = pool
+        return pool
+
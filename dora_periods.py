@@ -0,0 +1,209 @@
+import hashlib
+import io
+import re
+
+import numpy as np
+import pandas as pd
+
+from bounded_cache import BoundedCache
+
+# N-period DORA comparison. Every sheet of a workbook is one period, read into a
+# long (period, application, group, metric) table; consecutive deltas are
+# computed in one pass and the wide per-period views are cached by upload hash.
+#
+# Sheet layout: row 0 holds the metric group headers (DORA, Predictability,
+# ...), row 1 the metric names with the application id first, data below.
+
+HEADER_ROWS = 2
+KEY_COLUMN = "Application Id"
+MAX_CACHED_WORKBOOKS = 8
+_MONTH_NAME = re.compile(r"^\s*([A-Za-z]{3,9})[\s_-]*(\d{4})\s*$")
+
+_views = BoundedCache(max_entries=MAX_CACHED_WORKBOOKS)
+
+
+def _sheet_period(name):
+    # "May2025", "June 2025", "2025-05" -> Period('2025-05', 'M'); None otherwise
+    match = _MONTH_NAME.match(name)
+    text = f"{match.group(1)[:3]} {match.group(2)}" if match else name.strip()
+    if not match and not re.match(r"^\d{4}-\d{2}$", text):
+        return None
+    try:
+        return pd.Period(text, freq="M")
+    except ValueError:
+        return None
+
+
+# Period label per sheet: month-named sheets keep their month; otherwise (Sheet1,
+# Sheet2, ...) sheets are consecutive months from start when given, or their names
+def period_labels(sheet_names, start=None):
+    periods = [_sheet_period(name) for name in sheet_names]
+    if all(periods):
+        return [period.strftime("%B %Y") for period in periods]
+    if start:
+        first = pd.Period(start, freq="M")
+        return [(first + offset).strftime("%B %Y") for offset in range(len(sheet_names))]
+    return list(sheet_names)
+
+
+def _cell_text(values):
+    # the same text the old SQLite TEXT round trip produced: str(value), None for blanks
+    values = values.astype(object)
+    return np.where(pd.isna(values), None, values.astype(str))
+
+
+def _sheet_long(raw, period):
+    groups = raw.iloc[0].astype(object).where(raw.iloc[0].notna()).ffill()
+    metrics = raw.iloc[1].astype(str).str.strip()
+    data = raw.iloc[HEADER_ROWS:]
+    data = data[data.iloc[:, 0].notna()]
+    if data.empty or raw.shape[1] < 2:
+        return None
+    applications = data.iloc[:, 0].astype(str).str.strip().to_numpy()
+    values = data.iloc[:, 1:].to_numpy(dtype=object)
+    n_rows, n_metrics = values.shape
+    return pd.DataFrame({
+        "period": period,
+        "row": np.repeat(np.arange(n_rows), n_metrics),
+        "application": np.repeat(applications, n_metrics),
+        "group": np.tile(groups.iloc[1:].fillna("").astype(str).str.strip().to_numpy(), n_rows),
+        "metric": np.tile(metrics.iloc[1:].to_numpy(), n_rows),
+        "column": np.tile(np.arange(n_metrics), n_rows),
+        "value": pd.Series(_cell_text(values.ravel()), dtype=object),
+    })
+
+
+# Read every sheet of the workbook (one parse) into the long table
+# period / row / application / group / metric / column / value, with period an
+# ordered categorical in sheet order. Returns (long, key_column_name).
+def load_periods(source, start=None):
+    sheets = pd.read_excel(source, sheet_name=None, header=None, dtype=object)
+    sheets = {name: raw for name, raw in sheets.items() if raw.shape[0] > HEADER_ROWS}
+    labels = period_labels(list(sheets), start)
+    frames = [_sheet_long(raw, label) for label, raw in zip(labels, sheets.values())]
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        raise ValueError("No sheet with a metric header and data rows was found in the workbook")
+    first = next(iter(sheets.values()))
+    key = str(first.iloc[1, 0]).strip() if pd.notna(first.iloc[1, 0]) else KEY_COLUMN
+    long = pd.concat(frames, ignore_index=True)
+    long = long.drop_duplicates(["period", "application", "group", "metric"])
+    long["period"] = pd.Categorical(long["period"], categories=[f["period"].iloc[0] for f in frames], ordered=True)
+    return long, key
+
+
+# ▲/▼ for numeric changes, → for changed text, "(removed)" when the new value is
+# missing, the plain new value otherwise (old and new are object arrays)
+def change_markers(old, new):
+    old = pd.Series(old, dtype=object)
+    new = pd.Series(new, dtype=object)
+    old_text = old.to_numpy(dtype=object).astype(str)
+    new_text = new.to_numpy(dtype=object).astype(str)
+    old_num = pd.to_numeric(old, errors="coerce")
+    new_num = pd.to_numeric(new, errors="coerce")
+    numeric = (old_num.notna() & new_num.notna()).to_numpy()
+    return np.select(
+        [
+            old.isna().to_numpy(),
+            new.isna().to_numpy(),
+            numeric & (new_num > old_num).to_numpy(),
+            numeric & (new_num < old_num).to_numpy(),
+            ~numeric & (np.char.strip(old_text) != np.char.strip(new_text)),
+        ],
+        [new_text, np.char.add(old_text, " (removed)"), np.char.add(new_text, " ▲"),
+         np.char.add(new_text, " ▼"), np.char.add(new_text, " →")],
+        default=new_text,
+    ).astype(object)
+
+
+# Deltas between every pair of consecutive periods in one pass.
+# Returns the long table of cells shown in each period's view: the first period
+# as loaded, later periods with their change markers (applications missing from
+# a period against the previous one are kept and marked removed).
+def period_deltas(long):
+    cell = long.groupby(["application", "group", "metric"], sort=False).ngroup().to_numpy()
+    period = long["period"].cat.codes.to_numpy()
+    labels = long.drop_duplicates(["application", "group", "metric"]).sort_index()
+    shape = (cell.max() + 1, len(long["period"].cat.categories))
+    # absent cells read as NaN ("nan"), present blanks as None ("None"), as the old outer merge did
+    matrix = np.full(shape, np.nan, dtype=object)
+    present = np.zeros(shape, dtype=bool)
+    matrix[cell, period] = long["value"].to_numpy(dtype=object)
+    present[cell, period] = True
+
+    previous = np.empty_like(matrix)
+    previous[:, 0] = np.nan
+    previous[:, 1:] = matrix[:, :-1]
+    shown = np.where(
+        np.arange(matrix.shape[1]) == 0,
+        matrix,
+        change_markers(previous.ravel(), matrix.ravel()).reshape(matrix.shape),
+    )
+    visible = present.copy()
+    visible[:, 1:] |= present[:, :-1]
+
+    rows, cols = np.nonzero(visible)
+    return pd.DataFrame({
+        "period": pd.Categorical.from_codes(cols, dtype=long["period"].dtype),
+        "application": labels["application"].to_numpy()[rows],
+        "group": labels["group"].to_numpy()[rows],
+        "metric": labels["metric"].to_numpy()[rows],
+        "display": pd.Series(shown[rows, cols], dtype=object),
+    })
+
+
+# Wide frame of one period: one row per application, MultiIndex (group, metric)
+# columns in workbook order with the key column first. The first period keeps
+# the sheet's row order; comparison views are sorted by application.
+def period_frame(long, deltas, period, key=KEY_COLUMN):
+    columns = long[["group", "metric", "column"]].drop_duplicates(["group", "metric"]).sort_values("column", kind="stable")
+    columns = pd.MultiIndex.from_frame(columns[["group", "metric"]], names=[None, None])
+    cells = deltas[deltas["period"] == period]
+    if period == long["period"].cat.categories[0]:
+        order = long[long["period"] == period].sort_values("row", kind="stable")["application"].unique()
+    else:
+        order = sorted(cells["application"].unique())
+    # placed by position (unstack would turn the None blanks into NaN)
+    grid = np.full((len(order), len(columns)), np.nan, dtype=object)
+    rows = pd.Index(order).get_indexer(cells["application"])
+    cols = columns.get_indexer(pd.MultiIndex.from_frame(cells[["group", "metric"]]))
+    grid[rows, cols] = cells["display"].to_numpy(dtype=object)
+    wide = pd.DataFrame(grid, columns=columns)
+    wide.insert(0, ("", key), np.asarray(order, dtype=object))
+    if period == long["period"].cat.categories[0]:
+        # loaded values: columns of only integers or only decimals are shown as
+        # numbers (mixed columns stay text, as with the old to_sql column types)
+        for col in wide.columns[1:]:
+            text = wide[col].dropna().astype(str)
+            numbers = pd.to_numeric(text, errors="coerce")
+            decimals = text.str.contains(".", regex=False)
+            if len(text) and numbers.notna().all() and decimals.nunique() == 1:
+                wide[col] = pd.to_numeric(wide[col])
+    return wide
+
+
+# Display frames for every period of the workbook: [(period, frame), ...]
+def period_frames(source, start=None):
+    long, key = load_periods(source, start)
+    deltas = period_deltas(long)
+    return [(period, period_frame(long, deltas, period, key)) for period in long["period"].cat.categories]
+
+
+def with_target(frame, targets):
+    row = pd.DataFrame([[targets.get(metric, "") for _, metric in frame.columns]], columns=frame.columns, index=["TARGET"])
+    return pd.concat([row, frame], ignore_index=False)
+
+
+# Display frames of an uploaded workbook (bytes), with the TARGET row on top
+# when targets ({metric: target}) are given. Returns (upload_hash, [(period, frame), ...]);
+# each distinct upload is parsed and diffed once.
+def workbook_views(data, start=None, targets=None):
+    digest = hashlib.sha256(data).hexdigest()
+
+    def build():
+        views = period_frames(io.BytesIO(data), start)
+        if targets:
+            views = [(period, with_target(frame, targets)) for period, frame in views]
+        return views
+
+    return digest, _views.get_or_build((digest, start, tuple((targets or {}).items())), build)
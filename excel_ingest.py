@@ -0,0 +1,453 @@
+import hashlib
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from type_inference import apply_kinds, infer_kinds, sql_type
+
+# Streaming Excel ingestion.
+# Sheets are read row by row with openpyxl's read-only iterator, column types are
+# inferred once from a sample (type_inference), each chunk is converted in one
+# vectorized pass, and rows are written in batched executemany calls
+# inside a single transaction, so memory stays flat regardless of workbook size.
+
+CHUNK_SIZE = 5000
+SAMPLE_ROWS = 1000
+PROGRESS_INTERVAL = 0.2  # seconds between parse progress reports in parallel mode
+STATE_TABLE = "_ingest_sheets"
+ROW_HASH_TABLE = "_ingest_row_hashes"
+
+
+def sanitize_table_name(sheet_name):
+    table_name = sheet_name.strip().replace(" ", "_").replace("-", "_")
+    return ''.join(char for char in table_name if char.isalnum() or char == '_')
+
+
+# Column names as pandas would give them: "Unnamed: i" for blanks, ".1" suffix for duplicates
+def _header(row):
+    columns = []
+    for i, value in enumerate(row):
+        name = str(value) if value is not None else f"Unnamed: {i}"
+        candidate, n = name, 0
+        while candidate in columns:
+            n += 1
+            candidate = f"{name}.{n}"
+        columns.append(candidate)
+    return columns
+
+
+def _frame(rows, columns):
+    width = len(columns)
+    return pd.DataFrame([tuple(row[:width]) + (None,) * (width - len(row)) for row in rows], columns=columns)
+
+
+# Header, inferred kinds and a generator of converted chunks for one worksheet
+def _read_sheet(sheet, chunk_size, sample_rows, detect_dates, clean_columns):
+    rows = sheet.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return [], {}, iter(())
+    columns = _header(header)
+    if clean_columns:
+        columns = [col.strip().replace(" ", "_") for col in columns]
+    sample = []
+    for row in rows:
+        if any(value is not None for value in row):
+            sample.append(row)
+        if len(sample) >= sample_rows:
+            break
+    kinds = infer_kinds(_frame(sample, columns), sample_rows, detect_dates)
+
+    def chunks():
+        chunk = sample
+        while chunk:
+            yield apply_kinds(_frame(chunk, columns), kinds)
+            chunk = []
+            for row in rows:
+                if any(value is not None for value in row):
+                    chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    break
+
+    return columns, kinds, chunks()
+
+
+def _create_table(con, table_name, kinds):
+    quoted = ", ".join(f'"{col}" {sql_type(kind)}' for col, kind in kinds.items())
+    con.execute(f'DROP TABLE IF EXISTS "{table_name}";')
+    con.execute(f'CREATE TABLE "{table_name}" ({quoted});')
+
+
+# Index the key column so the per-key DELETEs of an upsert are lookups, not full scans
+def _index_key(con, table_name, key_column):
+    con.execute(f'CREATE INDEX IF NOT EXISTS "{table_name}__{key_column}_key" ON "{table_name}" ("{key_column}");')
+
+
+# Batched executemany per chunk; returns (row_count, preview_rows)
+def _write_chunks(con, table_name, columns, chunks, on_progress, expected_rows=None):
+    insert = f'INSERT INTO "{table_name}" VALUES ({", ".join("?" for _ in columns)});'
+    total = 0
+    preview = []
+    for chunk in chunks:
+        if not preview:
+            preview = chunk.head(5).values.tolist()
+        con.executemany(insert, chunk.itertuples(index=False, name=None))
+        total += len(chunk)
+        if on_progress:
+            on_progress(table_name, total, expected_rows)
+    return total, preview
+
+
+# --- Upsert mode ---
+# Per-table ingest state lives in two internal tables: the sheet checksum, key column and
+# schema of the last load, and one hash per row keyed by the key column value.
+
+def _ensure_state_tables(con):
+    con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+            table_name TEXT PRIMARY KEY, checksum TEXT, key_column TEXT, schema TEXT
+        );
+    """)
+    con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {ROW_HASH_TABLE} (
+            table_name TEXT, row_key TEXT, row_hash TEXT, PRIMARY KEY (table_name, row_key)
+        ) WITHOUT ROWID;
+    """)
+
+
+def _table_exists(con, table_name):
+    return con.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name = ?;", (table_name,)).fetchone() is not None
+
+
+# Cheap content checksum per sheet from the xlsx zip directory (CRC of the sheet part and the
+# shared strings part), so unchanged sheets are skipped without being parsed
+def _sheet_checksums(file, workbook, options):
+    if hasattr(file, "seek"):
+        file.seek(0)
+    try:
+        with zipfile.ZipFile(file) as archive:
+            crcs = {info.filename: f"{info.CRC}:{info.file_size}" for info in archive.infolist()}
+    except (zipfile.BadZipFile, OSError):
+        return {}
+    shared = crcs.get("xl/sharedStrings.xml", "")
+    checksums = {}
+    for sheet in workbook.worksheets:
+        part = getattr(sheet, "_worksheet_path", None)  # openpyxl read-only sheets only
+        if part in crcs:
+            raw = f"{crcs[part]}|{shared}|{options}"
+            checksums[sheet.title] = hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    return checksums
+
+
+# Key column: a unique, non-null *_id / *ID column, preferring the one named after the table
+# (loan_id for Loans, payment_id for Loan_Payments)
+def detect_key_column(table_name, sample):
+    table_words = [word.rstrip("s") for word in table_name.lower().split("_") if word]
+    candidates = []
+    for col in sample.columns:
+        name = str(col).lower().replace("_", "").replace(" ", "")
+        values = sample[col]
+        if not name.endswith("id") or values.isna().any() or values.astype(str).duplicated().any():
+            continue
+        stem = name[:-2].rstrip("s")
+        rank = len(table_words) - table_words.index(stem) if stem in table_words else len(table_words) + 1
+        candidates.append((rank, list(sample.columns).index(col), col))
+    return min(candidates)[2] if candidates else None
+
+
+# Forget the upsert state of a table that was rewritten some other way
+def clear_ingest_state(con, table_name):
+    if _table_exists(con, STATE_TABLE):
+        con.execute(f"DELETE FROM {STATE_TABLE} WHERE table_name = ?;", (table_name,))
+        con.execute(f"DELETE FROM {ROW_HASH_TABLE} WHERE table_name = ?;", (table_name,))
+
+
+def _row_hashes(chunk):
+    hashes = pd.util.hash_pandas_object(chunk.astype(str), index=False)
+    return hashes.map("{:016x}".format)
+
+
+# Replace the table and record its checksum (so an unchanged sheet is skipped next time)
+# and, when a key column exists, the row hashes for the next upsert
+def _replace_table(con, table_name, columns, kinds, chunks, key_column, checksum, on_progress, expected_rows):
+    _create_table(con, table_name, kinds)
+    clear_ingest_state(con, table_name)
+
+    def recorded(chunks):
+        for chunk in chunks:
+            con.executemany(
+                f"INSERT OR REPLACE INTO {ROW_HASH_TABLE} VALUES (?, ?, ?);",
+                zip([table_name] * len(chunk), chunk[key_column].astype(str), _row_hashes(chunk)),
+            )
+            yield chunk
+
+    if key_column is not None:
+        chunks = recorded(chunks)
+    total, preview = _write_chunks(con, table_name, columns, chunks, on_progress, expected_rows)
+    if key_column is not None:
+        _index_key(con, table_name, key_column)
+    schema = json.dumps([[col, sql_type(kind)] for col, kind in kinds.items()])
+    con.execute(f"INSERT INTO {STATE_TABLE} VALUES (?, ?, ?, ?);", (table_name, checksum, key_column, schema))
+    return total, preview
+
+
+class _DuplicateKey(Exception):
+    pass
+
+
+# Diff incoming rows against the stored row hashes and apply only the INSERT/UPDATE/DELETEs
+def _diff_table(con, table_name, columns, chunks, key_column, on_progress, expected_rows):
+    stored = dict(con.execute(
+        f"SELECT row_key, row_hash FROM {ROW_HASH_TABLE} WHERE table_name = ?;", (table_name,)
+    ).fetchall())
+    existing = pd.Series(stored, dtype=object)
+    seen = set()
+    changed = []
+    total = 0
+    preview = []
+    for chunk in chunks:
+        if not preview:
+            preview = chunk.head(5).values.tolist()
+        keys = chunk[key_column].astype(str)
+        if chunk[key_column].isna().any() or keys.duplicated().any() or not seen.isdisjoint(keys):
+            raise _DuplicateKey(key_column)
+        seen.update(keys)
+        hashes = _row_hashes(chunk)
+        mask = existing.reindex(keys.values).values != hashes.values
+        if mask.any():
+            changed.append((chunk[mask], keys[mask], hashes[mask]))
+        total += len(chunk)
+        if on_progress:
+            on_progress(table_name, total, expected_rows)
+
+    _index_key(con, table_name, key_column)  # tables loaded before the index existed
+    deleted = [key for key in stored if key not in seen]
+    delete = f'DELETE FROM "{table_name}" WHERE "{key_column}" = ?;'
+    con.executemany(delete, ((key,) for key in deleted))
+    con.executemany(f"DELETE FROM {ROW_HASH_TABLE} WHERE table_name = ? AND row_key = ?;",
+                    ((table_name, key) for key in deleted))
+    inserted = updated = 0
+    insert = f'INSERT INTO "{table_name}" VALUES ({", ".join("?" for _ in columns)});'
+    for rows, keys, hashes in changed:
+        is_update = keys.isin(stored.keys())
+        updated += int(is_update.sum())
+        inserted += int((~is_update).sum())
+        con.executemany(delete, ((value,) for value in rows.loc[is_update.values, key_column]))
+        con.executemany(insert, rows.itertuples(index=False, name=None))
+        con.executemany(f"INSERT OR REPLACE INTO {ROW_HASH_TABLE} VALUES (?, ?, ?);",
+                        zip([table_name] * len(keys), keys, hashes))
+    changed_keys = {key for _, keys, _ in changed for key in keys} | set(deleted)
+    return total, preview, {"inserted": inserted, "updated": updated, "deleted": len(deleted), "keys": changed_keys}
+
+
+# Write one parsed sheet in the requested mode; make_chunks() returns a fresh chunk iterator.
+# Returns (row_count, preview_rows, changes).
+def _store_sheet(con, table_name, columns, kinds, make_chunks, mode, checksum, on_progress, expected_rows=None):
+    if mode != "upsert":
+        clear_ingest_state(con, table_name)
+        _create_table(con, table_name, kinds)
+        total, preview = _write_chunks(con, table_name, columns, make_chunks(), on_progress, expected_rows)
+        return total, preview, {"mode": "replace"}
+
+    _ensure_state_tables(con)
+    chunks = make_chunks()
+    first = next(chunks, None)
+    sample = first if first is not None else pd.DataFrame(columns=columns)
+    key_column = detect_key_column(table_name, sample)
+    state = con.execute(
+        f"SELECT key_column, schema FROM {STATE_TABLE} WHERE table_name = ?;", (table_name,)
+    ).fetchone()
+    schema = json.dumps([[col, sql_type(kind)] for col, kind in kinds.items()])
+    chunks = itertools.chain([] if first is None else [first], chunks)
+
+    if key_column and state == (key_column, schema) and _table_exists(con, table_name):
+        try:
+            total, preview, changes = _diff_table(con, table_name, columns, chunks, key_column, on_progress, expected_rows)
+            con.execute(f"UPDATE {STATE_TABLE} SET checksum = ? WHERE table_name = ?;", (checksum, table_name))
+            return total, preview, dict(changes, mode="upsert", key=key_column)
+        except _DuplicateKey:
+            # keys turned out not to be unique past the sample: reload the whole sheet
+            con.execute(f'DELETE FROM "{table_name}";')
+            chunks, key_column = make_chunks(), None
+    total, preview = _replace_table(
+        con, table_name, columns, kinds, chunks, key_column, checksum, on_progress, expected_rows
+    )
+    return total, preview, {"mode": "replace", "key": key_column}
+
+
+def _unchanged(con, table_name, checksum):
+    if not checksum or not _table_exists(con, table_name):
+        return None
+    _ensure_state_tables(con)
+    state = con.execute(f"SELECT checksum, schema FROM {STATE_TABLE} WHERE table_name = ?;", (table_name,)).fetchone()
+    if not state or state[0] != checksum:
+        return None
+    rows = con.execute(f'SELECT COUNT(*) FROM "{table_name}";').fetchone()[0]
+    return table_name, rows, [col for col, _ in json.loads(state[1])], [], {"mode": "unchanged"}
+
+
+# Stream every sheet of the workbook into its own table in one transaction.
+# mode="replace" rewrites each table; mode="upsert" skips sheets whose content checksum is
+# unchanged and otherwise applies only the changed rows (by key column and row hash),
+# falling back to a replace when no key column is found or the columns changed.
+# on_progress(table_name, rows_processed, total_rows_or_None) is called after every batch.
+# Returns [(table_name, row_count, columns, preview_rows, changes), ...].
+def ingest_workbook(file, con, chunk_size=CHUNK_SIZE, sample_rows=SAMPLE_ROWS, detect_dates=True,
+                    clean_columns=False, table_namer=sanitize_table_name, on_progress=None, mode="replace"):
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    options = (detect_dates, clean_columns, sample_rows)
+    checksums = _sheet_checksums(file, workbook, options) if mode == "upsert" else {}
+    loaded = []
+    try:
+        if not con.in_transaction:
+            con.execute("BEGIN;")
+        for sheet in workbook.worksheets:
+            table_name = table_namer(sheet.title)
+            checksum = checksums.get(sheet.title)
+            skipped = _unchanged(con, table_name, checksum) if mode == "upsert" else None
+            if skipped:
+                loaded.append(skipped)
+                continue
+            columns, kinds, chunks = _read_sheet(sheet, chunk_size, sample_rows, detect_dates, clean_columns)
+            if not columns:
+                continue
+            pending = [chunks]
+
+            def make_chunks(sheet=sheet):
+                # first call reuses the open iterator, a fallback re-reads the sheet
+                if pending:
+                    return pending.pop()
+                return _read_sheet(sheet, chunk_size, sample_rows, detect_dates, clean_columns)[2]
+
+            total, preview, changes = _store_sheet(
+                con, table_name, columns, kinds, make_chunks, mode, checksum, on_progress
+            )
+            loaded.append((table_name, total, columns, preview, changes))
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+    finally:
+        workbook.close()
+    return loaded
+
+
+_worker_progress = None
+
+
+def _init_worker(progress):
+    global _worker_progress
+    _worker_progress = progress
+
+
+# Process-pool worker: parse and normalize one sheet, return it as NumPy column arrays.
+# (sheet_title, rows_parsed) goes to the progress queue after every chunk.
+def _parse_sheet(data, sheet_title, sample_rows, detect_dates, clean_columns):
+    workbook = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        columns, kinds, chunks = _read_sheet(
+            workbook[sheet_title], CHUNK_SIZE, sample_rows, detect_dates, clean_columns
+        )
+        frames = []
+        rows = 0
+        for chunk in chunks:
+            frames.append(chunk)
+            rows += len(chunk)
+            if _worker_progress is not None:
+                _worker_progress.put((sheet_title, rows))
+    finally:
+        workbook.close()
+    frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+    return columns, kinds, {col: frame[col].to_numpy(dtype=object) for col in columns}
+
+
+def _array_chunks(columns, arrays, chunk_size):
+    rows = len(arrays[columns[0]]) if columns else 0
+    for start in range(0, rows, chunk_size):
+        yield pd.DataFrame({col: arrays[col][start:start + chunk_size] for col in columns}, columns=columns)
+
+
+# Parallel mode: sheets are parsed and type-converted in a process pool (CPU-bound, independent
+# per sheet) while this process is the single writer, committing everything in one transaction.
+# Holds each parsed sheet in memory, so it trades the flat-memory guarantee for wall time.
+# Workers are spawned, not forked: the app process runs threads (LLM loop, query log writer)
+# whose locks a forked child could inherit held. on_progress gets the rows parsed so far
+# (total None) while a sheet is parsed, then the rows written against the sheet's total.
+def ingest_workbook_parallel(file, con, chunk_size=CHUNK_SIZE, sample_rows=SAMPLE_ROWS, detect_dates=True,
+                             clean_columns=False, table_namer=sanitize_table_name, on_progress=None,
+                             mode="replace", max_workers=None):
+    data = file.getvalue() if hasattr(file, "getvalue") else file.read()
+    workbook = load_workbook(io.BytesIO(data), read_only=True)
+    titles = workbook.sheetnames
+    options = (detect_dates, clean_columns, sample_rows)
+    checksums = _sheet_checksums(io.BytesIO(data), workbook, options) if mode == "upsert" else {}
+    workbook.close()
+    loaded = {}
+    try:
+        if not con.in_transaction:
+            con.execute("BEGIN;")
+        if mode == "upsert":
+            for title in titles:
+                skipped = _unchanged(con, table_namer(title), checksums.get(title))
+                if skipped:
+                    loaded[title] = skipped
+    except Exception:
+        con.rollback()
+        raise
+    pending_titles = [title for title in titles if title not in loaded]
+    workers = max_workers or min(len(pending_titles), os.cpu_count() or 1) or 1
+    context = multiprocessing.get_context("spawn")
+    progress = context.Queue()
+    finished = set()  # late parse reports must not overwrite write progress
+
+    def report_parsed():
+        while True:
+            try:
+                title, rows = progress.get_nowait()
+            except queue.Empty:
+                return
+            if on_progress and title not in finished:
+                on_progress(table_namer(title), rows, None)
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(progress,)) as executor:
+        futures = {
+            executor.submit(_parse_sheet, data, title, sample_rows, detect_dates, clean_columns): title
+            for title in pending_titles
+        }
+        try:
+            waiting = set(futures)
+            while waiting:
+                done, waiting = wait(waiting, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED)
+                report_parsed()
+                for future in done:
+                    title = futures[future]
+                    finished.add(title)
+                    table_name = table_namer(title)
+                    columns, kinds, arrays = future.result()
+                    if not columns:
+                        continue
+                    expected = len(arrays[columns[0]])
+                    if on_progress:
+                        on_progress(table_name, 0, expected)
+                    total, preview, changes = _store_sheet(
+                        con, table_name, columns, kinds, lambda: _array_chunks(columns, arrays, chunk_size),
+                        mode, checksums.get(title), on_progress, expected,
+                    )
+                    loaded[title] = (table_name, total, columns, preview, changes)
+            con.commit()
+        except Exception:
+            con.rollback()
+            for pending in futures:
+                pending.cancel()
+            raise
+    # report in workbook order
+    return [loaded[title] for title in titles if title in loaded]
@@ -0,0 +1,183 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from query_guard import QueryGuardError, time_limit
+from result_cache import normalize_sql
+from schema_cache import build_schema_catalog
+from sql_cache import cached_questions
+
+# Index advisor: records executed SQL per database, derives candidate indexes
+# from its join / filter / group-by columns, and keeps a candidate only when the
+# recorded queries switch to it in EXPLAIN QUERY PLAN and run measurably faster.
+
+MAX_HISTORY = 500
+MIN_QUERIES = 1  # recorded queries that must use an index before it is created
+TIMING_TIMEOUT = float(os.getenv("IndexAdvisorTimeout", "2"))  # per query run, seconds
+ADVISOR_BUDGET = float(os.getenv("IndexAdvisorBudget", "10"))  # whole advisor pass, seconds
+MIN_SPEEDUP = 0.2  # an index must cut the affected queries' time by this share ...
+MIN_SAVING_MS = 1.0  # ... and by at least this much
+INDEX_PREFIX = "ix_"
+
+_lock = threading.Lock()
+_history = {}
+
+_KEYWORDS = {
+    "select", "from", "where", "join", "inner", "left", "right", "outer", "cross", "on", "and", "or", "not",
+    "group", "by", "order", "having", "limit", "as", "in", "is", "null", "like", "between", "distinct",
+    "case", "when", "then", "else", "end", "asc", "desc", "union", "all", "exists", "using", "natural",
+}
+_CLAUSE = re.compile(r"\b(on|where|group\s+by|having|order\s+by|limit|select|from|join)\b", re.IGNORECASE)
+_TABLE_REF = re.compile(r"\b(?:from|join)\s+\"?(\w+)\"?(?:\s+(?:as\s+)?(\w+))?", re.IGNORECASE)
+_COLUMN_REF = re.compile(r"(?:\"?(\w+)\"?\s*\.\s*)?\"?([A-Za-z_]\w*)\"?")
+
+
+# Remember an executed query (by normalized SQL) for the advisor
+def record_query(db_path, sql):
+    with _lock:
+        history = _history.setdefault(db_path, Counter())
+        history[normalize_sql(sql)] += 1
+        if len(history) > MAX_HISTORY:
+            for old, _ in history.most_common()[MAX_HISTORY:]:
+                del history[old]
+
+
+# Recorded queries plus the SQL kept in the question cache and any extra
+# (e.g. dashboard) queries, as {sql: weight}
+def query_history(db_path, extra=()):
+    with _lock:
+        queries = Counter(_history.get(db_path, {}))
+    for _, _, sql in cached_questions(db_path):
+        queries[normalize_sql(sql)] += 1
+    for sql in extra:
+        queries[normalize_sql(sql)] += 1
+    return queries
+
+
+def _strip_literals(sql):
+    return re.sub(r"'(?:[^']|'')*'", "''", sql)
+
+
+# {(table, column)} used in JOIN ... ON, WHERE, GROUP BY and HAVING clauses of a query
+def referenced_columns(sql, catalog):
+    sql = _strip_literals(sql)
+    tables = {name.lower(): name for name in catalog["tables"]}
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(sql):
+        if table.lower() in tables:
+            aliases[table.lower()] = tables[table.lower()]
+            if alias and alias.lower() not in _KEYWORDS:
+                aliases[alias.lower()] = tables[table.lower()]
+    in_query = set(aliases.values())
+    columns_of = {table: {col.lower(): col for col, _ in catalog["tables"][table]} for table in in_query}
+
+    used = set()
+    parts = _CLAUSE.split(sql)
+    for clause, body in zip(parts[1::2], parts[2::2]):
+        if clause.lower().split()[0] not in ("on", "where", "group", "having"):
+            continue
+        for qualifier, name in _COLUMN_REF.findall(body):
+            if name.lower() in _KEYWORDS:
+                continue
+            if qualifier:
+                table = aliases.get(qualifier.lower())
+                owners = [table] if table and name.lower() in columns_of[table] else []
+            else:
+                owners = [table for table in in_query if name.lower() in columns_of[table]]
+            if len(owners) == 1:
+                used.add((owners[0], columns_of[owners[0]][name.lower()]))
+    return used
+
+
+# Leading columns of the indexes that already exist on a table
+def _indexed_columns(con, table):
+    indexed = set()
+    for index in con.execute(f'PRAGMA index_list("{table}");').fetchall():
+        info = con.execute(f'PRAGMA index_info("{index[1]}");').fetchall()
+        if info:
+            indexed.add(info[0][2])
+    return indexed
+
+
+def _plan(con, sql):
+    return [row[-1] for row in con.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()]
+
+
+# Seconds for one run of sql, or None when it ran past timeout
+def _timed(con, sql, timeout=TIMING_TIMEOUT):
+    start = time.perf_counter()
+    try:
+        with time_limit(con, timeout):
+            con.execute(sql).fetchall()
+    except QueryGuardError:
+        return None
+    return time.perf_counter() - start
+
+
+def index_name(table, column):
+    return f"{INDEX_PREFIX}{table}_{column}".lower()
+
+
+# Candidate single-column indexes for the given queries: {(table, column): [sql, ...]}
+def candidate_indexes(con, queries):
+    catalog = build_schema_catalog(con)
+    candidates = {}
+    indexed = {}
+    for sql in queries:
+        for table, column in referenced_columns(sql, catalog):
+            if table not in indexed:
+                indexed[table] = _indexed_columns(con, table)
+            if column not in indexed[table]:
+                candidates.setdefault((table, column), []).append(sql)
+    return candidates
+
+
+# Try every candidate index and keep the ones the query planner picks and that make
+# the recorded queries measurably faster (each query is timed once before and once
+# after, under a time limit). Runs on a write connection, so callers should use a
+# short writer session of its own; the whole pass stops after budget seconds.
+# Indexes that do not pay off are rolled back. Returns one report row per created index.
+def advise_indexes(con, queries, min_queries=MIN_QUERIES, timeout=TIMING_TIMEOUT, budget=ADVISOR_BUDGET):
+    deadline = time.monotonic() + budget
+    weights = Counter(queries)
+    runnable = []
+    for sql in weights:
+        try:
+            _plan(con, sql)
+            runnable.append(sql)
+        except sqlite3.Error:
+            continue  # stale SQL for tables that no longer exist
+    report = []
+    for (table, column), affected in candidate_indexes(con, runnable).items():
+        if time.monotonic() > deadline:
+            break
+        name = index_name(table, column)
+        create = f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ("{column}");'
+        con.execute("SAVEPOINT index_advisor;")
+        con.execute(create)
+        used = [sql for sql in affected if any(name in step for step in _plan(con, sql))]
+        after = {sql: _timed(con, sql, timeout) for sql in used} if sum(weights[sql] for sql in used) >= min_queries else {}
+        con.execute("ROLLBACK TO index_advisor;")
+        con.execute("RELEASE index_advisor;")
+        if not after or None in after.values():
+            continue
+        # a run that times out without the index counts as the limit (a lower bound)
+        before = {sql: _timed(con, sql, timeout) for sql in used}
+        before = {sql: timeout if run is None else run for sql, run in before.items()}
+        before_total = sum(before[sql] * weights[sql] for sql in used)
+        after_total = sum(after[sql] * weights[sql] for sql in used)
+        if before_total - after_total < max(before_total * MIN_SPEEDUP, MIN_SAVING_MS / 1000):
+            continue
+        con.execute(create)
+        report.append({
+            "index": name,
+            "table": table,
+            "column": column,
+            "queries": len(used),
+            "before_ms": round(before_total * 1000, 3),
+            "after_ms": round(after_total * 1000, 3),
+        })
+    return report
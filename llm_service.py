@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import json
+import os
+import queue
+import random
+import threading
+
+import openai
+from openai import AsyncAzureOpenAI
+
+from sql_extract import first_statement
+
+# Shared async LLM client: one event loop per process, bounded concurrency,
+# single-flight for identical prompts, retries with full-jitter backoff.
+# SQL answers are streamed and closed once the first statement is complete.
+
+API_VERSION = "2024-12-01-preview"
+MAX_CONCURRENCY = int(os.getenv("LLMMaxConcurrency", "8"))
+REQUEST_TIMEOUT = float(os.getenv("LLMTimeout", "30"))
+MAX_RETRIES = int(os.getenv("LLMMaxRetries", "3"))
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+
+RETRYABLE_ERRORS = (
+    asyncio.TimeoutError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+_lock = threading.Lock()
+_services = {}
+
+
+# Identical model + messages + parameters share one request
+def prompt_key(model, messages, params):
+    raw = json.dumps([model, messages, params], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class LLMService:
+    def __init__(self, endpoint, api_key, api_version=API_VERSION, max_concurrency=MAX_CONCURRENCY,
+                 timeout=REQUEST_TIMEOUT, max_retries=MAX_RETRIES):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        # retries are handled here (with jitter), not by the SDK
+        self._client = AsyncAzureOpenAI(
+            azure_endpoint=endpoint, api_key=api_key, api_version=api_version, max_retries=0, timeout=timeout,
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._inflight = {}
+        self.stats = {"requests": 0, "coalesced": 0, "retries": 0, "failures": 0, "stopped_early": 0}
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-service", daemon=True)
+        self._thread.start()
+
+    async def _request(self, model, messages, params):
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    self.stats["requests"] += 1
+                    completion = await asyncio.wait_for(
+                        self._client.chat.completions.create(model=model, messages=messages, **params),
+                        self.timeout,
+                    )
+                return completion.choices[0].message.content or ""
+            except RETRYABLE_ERRORS:
+                if attempt == self.max_retries:
+                    self.stats["failures"] += 1
+                    raise
+                self.stats["retries"] += 1
+                await asyncio.sleep(backoff_delay(attempt))
+
+    # Stream the answer until the first SQL statement is complete, then close the stream.
+    # Returns the statement, or the whole answer when it holds no SQL.
+    async def _stream_sql(self, model, messages, params, deltas):
+        async def consume():
+            text = ""
+            stream = await self._client.chat.completions.create(
+                model=model, messages=messages, stream=True, **params
+            )
+            try:
+                async for chunk in stream:
+                    # Azure sends a first chunk without choices (content filter results)
+                    if not chunk.choices or not chunk.choices[0].delta.content:
+                        continue
+                    text += chunk.choices[0].delta.content
+                    if deltas is not None:
+                        deltas.put(text)
+                    statement, complete = first_statement(text)
+                    if complete:
+                        self.stats["stopped_early"] += 1
+                        return statement
+            finally:
+                await stream.close()
+            return first_statement(text)[0] or text
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    self.stats["requests"] += 1
+                    return await asyncio.wait_for(consume(), self.timeout)
+            except RETRYABLE_ERRORS:
+                if attempt == self.max_retries:
+                    self.stats["failures"] += 1
+                    raise
+                self.stats["retries"] += 1
+                await asyncio.sleep(backoff_delay(attempt))
+
+    # Run one shared request per key; later identical callers join the one in flight
+    async def _single_flight(self, key, start):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(start())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.stats["coalesced"] += 1
+        # one waiter giving up must not cancel the shared request
+        return await asyncio.shield(task)
+
+    # Completion text for the messages; joins an identical request already in flight
+    async def complete(self, model, messages, **params):
+        key = prompt_key(model, messages, params)
+        return await self._single_flight(key, lambda: self._request(model, messages, params))
+
+    # First SQL statement of the streamed answer; deltas (a queue) receives the text so far
+    async def complete_sql(self, model, messages, deltas=None, **params):
+        key = prompt_key(model, messages, dict(params, sql_stream=True))
+        return await self._single_flight(key, lambda: self._stream_sql(model, messages, params, deltas))
+
+    # Blocking entry point for Streamlit script threads
+    def generate(self, model, messages, **params):
+        return asyncio.run_coroutine_threadsafe(self.complete(model, messages, **params), self._loop).result()
+
+    # Blocking streamed SQL generation; on_delta(text_so_far) runs in the calling thread,
+    # so it can update Streamlit elements while tokens arrive
+    def generate_sql(self, model, messages, on_delta=None, **params):
+        deltas = queue.Queue() if on_delta else None
+        future = asyncio.run_coroutine_threadsafe(self.complete_sql(model, messages, deltas, **params), self._loop)
+        while deltas is not None and not (future.done() and deltas.empty()):
+            try:
+                on_delta(deltas.get(timeout=0.05))
+            except queue.Empty:
+                continue
+        return future.result()
+
+
+# Process-wide service per endpoint
+def get_service(endpoint, api_key, api_version=API_VERSION):
+    with _lock:
+        key = (endpoint, api_key, api_version)
+        service = _services.get(key)
+        if service is None:
+            service = LLMService(endpoint, api_key, api_version)
+            _services[key] = service
+        return service
@@ -0,0 +1,114 @@
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the Azure OpenAI chat completions endpoint, for load and
+# retry testing without spending tokens. Point EndPoint_URL at it, e.g.
+#   python mock_llm_server.py --port 8089 --latency 1.5 --fail-rate 0.1
+#   EndPoint_URL=http://127.0.0.1:8089 EndPoint_KEY=mock streamlit run Test3.py
+# Every request answers with MOCK_SQL after the configured latency; a share of
+# requests fails with 429/500 so the client's backoff can be exercised.
+# stream=True requests get the answer word by word as server-sent events,
+# followed by an explanation a streaming client should never wait for.
+
+MOCK_SQL = os.getenv("MOCK_SQL", "SELECT * FROM Customers LIMIT 5;")
+MOCK_EXPLANATION = " This query returns the first five customers with all of their columns."
+
+
+def completion_body(model, content):
+    return {
+        "id": f"mock-{time.time_ns()}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+def chunk_body(model, content):
+    return {
+        "id": f"mock-{time.time_ns()}",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}],
+    }
+
+
+def make_handler(latency, fail_rate, content, token_delay=0.0):
+    class Handler(BaseHTTPRequestHandler):
+        requests = 0
+        streamed_tokens = 0
+
+        def _send(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            Handler.requests += 1
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if "/chat/completions" not in self.path:
+                self._send(404, {"error": {"message": "not found"}})
+                return
+            time.sleep(latency)
+            if random.random() < fail_rate:
+                status = random.choice((429, 500))
+                self._send(status, {"error": {"code": str(status), "message": "mock failure"}})
+                return
+            model = request.get("model") or self.path.split("/deployments/")[-1].split("/")[0]
+            if request.get("stream"):
+                self._stream(model, content + MOCK_EXPLANATION)
+            else:
+                self._send(200, completion_body(model, content))
+
+        def _stream(self, model, text):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            Handler.streamed_tokens = 0
+            try:
+                for token in text.split(" "):
+                    time.sleep(token_delay)
+                    event = json.dumps(chunk_body(model, token + " "))
+                    self.wfile.write(f"data: {event}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    Handler.streamed_tokens += 1
+                self.wfile.write(b"data: [DONE]\n\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # client stopped reading early
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+# Start the mock in a background thread; port 0 picks a free port.
+# Returns (server, base_url).
+def start_mock_server(port=0, latency=0.0, fail_rate=0.0, content=MOCK_SQL, token_delay=0.0):
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(latency, fail_rate, content, token_delay))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock Azure OpenAI chat completions endpoint")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=1.0, help="seconds before each answer")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with 429/500")
+    parser.add_argument("--token-delay", type=float, default=0.05, help="seconds between streamed tokens")
+    args = parser.parse_args()
+    handler = make_handler(args.latency, args.fail_rate, MOCK_SQL, args.token_delay)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), handler)
+    print(f"Mock LLM endpoint on http://127.0.0.1:{args.port}")
+    server.serve_forever()
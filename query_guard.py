@@ -0,0 +1,97 @@
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from schema_cache import get_schema_catalog
+
+# Execution guard for generated SQL: read-only connections, a wall-clock limit
+# and user cancel via a progress handler, a row cap, and refusal of plans that
+# cross-join large tables with no join condition.
+
+QUERY_TIMEOUT = float(os.getenv("QueryTimeout", "15"))
+ROW_CAP = int(os.getenv("QueryRowCap", "10000"))
+MAX_CROSS_ROWS = int(os.getenv("QueryMaxCrossRows", "1000000"))
+PROGRESS_STEPS = 10000  # SQLite VM instructions between progress handler calls
+POLL_SECONDS = 0.2
+
+_TABLE_REF = re.compile(r"(?:\bfrom|\bjoin|,)\s+\"?(\w+)\"?(?:\s+(?:as\s+)?(\w+))?", re.IGNORECASE)
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("QueryWorkers", "8")), thread_name_prefix="query")
+
+
+class QueryGuardError(Exception):
+    pass
+
+
+def _estimated_rows(con, table):
+    # rowid tables: MAX(rowid) is an O(log n) upper bound on the row count
+    return con.execute(f'SELECT COALESCE(MAX(rowid), 0) FROM "{table}";').fetchone()[0]
+
+
+# Refuse plans that loop full scans of several tables inside each other when the
+# product of their sizes exceeds max_rows (cross products / joins without conditions)
+def check_plan(con, sql, max_rows=MAX_CROSS_ROWS):
+    tables = {name.lower(): name for name in get_schema_catalog(con)["tables"]}
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(sql):
+        if table.lower() in tables:
+            aliases[table.lower()] = tables[table.lower()]
+            if alias:
+                aliases[alias.lower()] = tables[table.lower()]
+    scans = {}
+    for _, parent, _, detail in con.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall():
+        match = re.match(r"SCAN (\w+)", detail)
+        if match and match.group(1).lower() in aliases:
+            scans.setdefault(parent, []).append(aliases[match.group(1).lower()])
+    for scanned in scans.values():
+        if len(scanned) < 2:
+            continue
+        rows = 1
+        for table in scanned:
+            rows *= max(_estimated_rows(con, table), 1)
+        if rows > max_rows:
+            raise QueryGuardError(
+                f"Query refused: it combines every row of {' x '.join(scanned)} (~{rows:,} row pairs) "
+                f"without a join condition. Add a JOIN ... ON condition."
+            )
+
+
+# Abort statements on this connection past timeout seconds or once cancel is set
+@contextmanager
+def time_limit(con, timeout=QUERY_TIMEOUT, cancel=None):
+    deadline = time.monotonic() + timeout
+
+    def should_abort():
+        return time.monotonic() > deadline or (cancel is not None and cancel.is_set())
+
+    con.set_progress_handler(should_abort, PROGRESS_STEPS)
+    try:
+        yield
+    except Exception as e:
+        if "interrupted" not in str(e):
+            raise
+        if cancel is not None and cancel.is_set():
+            raise QueryGuardError("Query cancelled.") from e
+        raise QueryGuardError(f"Query stopped after {timeout:g}s. Try narrowing it down.") from e
+    finally:
+        con.set_progress_handler(None, 0)
+
+
+# Run query(cancel) on a worker thread while the caller's thread polls on_wait(elapsed).
+# If the caller is stopped (e.g. a Streamlit rerun raised inside on_wait) the query
+# is cancelled through its progress handler.
+def run_cancellable(query, on_wait=None, poll_seconds=POLL_SECONDS):
+    cancel = threading.Event()
+    future = _executor.submit(query, cancel)
+    start = time.monotonic()
+    try:
+        while True:
+            try:
+                return future.result(timeout=poll_seconds)
+            except FutureTimeout:
+                if on_wait:
+                    on_wait(time.monotonic() - start)
+    finally:
+        cancel.set()
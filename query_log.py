@@ -0,0 +1,195 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Structured query log: one entry per question (SQL, latency per stage, row
+# count, cache hit, error) written in batches by a background thread to SQLite,
+# or JSONL when QueryLogPath ends in .jsonl. Result rows only for sampled entries.
+
+QUERY_LOG_PATH = os.getenv("QueryLogPath", "query_log.db")
+SAMPLE_RATE = float(os.getenv("QueryLogSampleRate", "0"))
+SAMPLE_ROWS = int(os.getenv("QueryLogSampleRows", "100"))
+BATCH_SIZE = 50
+FLUSH_SECONDS = 2.0
+QUEUE_SIZE = 10000
+
+FIELDS = ("ts", "app", "question", "sql", "source", "cache_hit", "row_count", "total_ms", "stages", "error", "result")
+
+_lock = threading.Lock()
+_logger = None
+_close = None
+stats = {"queued": 0, "dropped": 0, "written": 0}
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    # never block or raise on the request path: a full queue drops the record
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            stats["queued"] += 1
+        except queue.Full:
+            stats["dropped"] += 1
+
+    def prepare(self, record):
+        return record  # entries are plain dicts; skip message formatting
+
+
+def _write_sqlite(path, entries):
+    con = sqlite3.connect(path)
+    try:
+        con.execute(f"CREATE TABLE IF NOT EXISTS query_log (id INTEGER PRIMARY KEY, {', '.join(FIELDS)})")
+        con.executemany(
+            f"INSERT INTO query_log ({', '.join(FIELDS)}) VALUES ({', '.join('?' * len(FIELDS))})",
+            [tuple(_column(entry.get(field)) for field in FIELDS) for entry in entries],
+        )
+        con.commit()
+    finally:
+        con.close()
+
+
+def _column(value):
+    return json.dumps(value, default=str) if isinstance(value, (dict, list)) else value
+
+
+def _write_jsonl(path, entries):
+    with open(path, "a", encoding="utf-8") as log:
+        for entry in entries:
+            log.write(json.dumps(entry, default=str) + "\n")
+
+
+# Background writer: drains the queue and writes a batch every BATCH_SIZE
+# entries or FLUSH_SECONDS, whichever comes first
+def _writer(records, path, batch_size, flush_seconds):
+    write = _write_jsonl if path.endswith(".jsonl") else _write_sqlite
+    batch = []
+    deadline = time.monotonic() + flush_seconds
+    while True:
+        try:
+            record = records.get(timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Empty:
+            record = None
+        stop = record is _STOP
+        if record is not None and not stop:
+            batch.append(record.entry)
+        if batch and (stop or len(batch) >= batch_size or time.monotonic() >= deadline):
+            try:
+                write(path, batch)
+                stats["written"] += len(batch)
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Query log write failed ({len(batch)} entries): {e}")
+            batch = []
+        if time.monotonic() >= deadline:
+            deadline = time.monotonic() + flush_seconds
+        if stop:
+            return
+
+
+_STOP = object()
+
+
+# The "query_log" logger, started once per process with its writer thread
+def get_query_logger(path=QUERY_LOG_PATH, batch_size=BATCH_SIZE, flush_seconds=FLUSH_SECONDS):
+    global _logger, _close
+    with _lock:
+        if _logger is None:
+            records = queue.Queue(QUEUE_SIZE)
+            logger = logging.getLogger("query_log")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False  # structured entries stay out of app.log
+            logger.addHandler(_DroppingQueueHandler(records))
+            thread = threading.Thread(
+                target=_writer, args=(records, path, batch_size, flush_seconds), name="query-log", daemon=True
+            )
+            thread.start()
+
+            def close():
+                if thread.is_alive():
+                    records.put(_STOP)
+                    thread.join(timeout=5)
+
+            _logger, _close = logger, close
+        return _logger
+
+
+# Write what is still queued and stop the writer (also run at exit)
+def close_query_log():
+    global _logger, _close
+    with _lock:
+        logger, close = _logger, _close
+        _logger = _close = None
+    if logger is not None:
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        close()
+
+
+atexit.register(close_query_log)
+
+
+# Time a stage of handling one question into stages[name] (milliseconds)
+@contextmanager
+def timed(stages, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages[name] = round((time.perf_counter() - start) * 1000, 1)
+
+
+# Queue one structured entry. result is a callable returning a DataFrame; it is
+# only called (and its first SAMPLE_ROWS rows kept) for a sampled entry.
+def log_query(question, sql, stages=None, row_count=None, cache_hit=False, source=None,
+              error=None, app=None, result=None, sample_rate=SAMPLE_RATE):
+    stages = dict(stages or {})
+    entry = {
+        "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "app": app,
+        "question": question,
+        "sql": sql,
+        "source": source,
+        "cache_hit": bool(cache_hit),
+        "row_count": row_count,
+        "total_ms": round(sum(stages.values()), 1),
+        "stages": stages,
+        "error": str(error) if error else None,
+        "result": None,
+    }
+    if result is not None and sample_rate and random.random() < sample_rate:
+        try:
+            entry["result"] = result().head(SAMPLE_ROWS).to_dict(orient="split")
+        except Exception as e:
+            entry["result"] = {"error": str(e)}
+    get_query_logger().info("query", extra={"entry": entry})
+
+
+# Entries of a query log written by this module, oldest first
+def read_query_log(path=QUERY_LOG_PATH):
+    if not os.path.exists(path):
+        return []
+    if path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as log:
+            return [json.loads(line) for line in log if line.strip()]
+    con = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        con.row_factory = sqlite3.Row
+        rows = con.execute("SELECT * FROM query_log ORDER BY id").fetchall()
+    except sqlite3.OperationalError:
+        return []
+    finally:
+        con.close()
+    entries = []
+    for row in rows:
+        entry = {field: row[field] for field in FIELDS}
+        entry["cache_hit"] = bool(entry["cache_hit"])
+        for field in ("stages", "result"):
+            entry[field] = json.loads(entry[field]) if entry[field] else None
+        entries.append(entry)
+    return entries
@@ -0,0 +1,111 @@
+import math
+import sqlite3
+import threading
+from collections import Counter
+
+from sql_cache import cache_version, cached_questions, normalize_question
+
+# Near-duplicate question matching.
+# Character n-gram TF-IDF cosine over the questions already in the SQL cache, so
+# paraphrases like "calculate total loan amount for all customers?" reuse the SQL
+# generated for "total loan amount for all customers". Similarity only ranks the
+# candidates: a match must also have the same content words (numbers and quoted
+# values included, filler words and plurals aside) and EXPLAIN cleanly against
+# the current schema, so "greater than 60000" never reuses the SQL for 50000.
+
+NGRAM_SIZE = 3
+SIMILARITY_THRESHOLD = 0.85
+
+# Request phrasing that does not change what is being asked
+FILLER_WORDS = {
+    "a", "an", "the", "please", "show", "me", "give", "list", "display", "find", "get",
+    "calculate", "compute", "tell", "what", "is", "are", "can", "you", "i", "want", "to", "see",
+}
+
+_lock = threading.Lock()
+_index = {"version": None}
+
+
+def match_text(question):
+    return " ".join(word for word in normalize_question(question).split() if word not in FILLER_WORDS)
+
+
+def _stem(word):
+    # "customers" == "customer"; numbers and short words are kept as they are
+    if word.isalpha() and len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+# The words that change what is asked: a paraphrase may reorder or pad them, not change them
+def content_words(question):
+    return frozenset(_stem(word) for word in match_text(question).split())
+
+
+def char_ngrams(text, n=NGRAM_SIZE):
+    padded = f" {match_text(text)} "
+    return Counter(padded[i:i + n] for i in range(max(len(padded) - n + 1, 1)))
+
+
+# Unseen n-grams get the maximum idf so extra words in the question lower the similarity
+def _weights(grams, idf, default_idf):
+    vector = {gram: count * idf.get(gram, default_idf) for gram, count in grams.items()}
+    norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+    return {gram: weight / norm for gram, weight in vector.items()}
+
+
+def _build_index(rows):
+    grams = [char_ngrams(question) for question, _, _ in rows]
+    doc_freq = Counter()
+    for doc in grams:
+        doc_freq.update(doc.keys())
+    idf = {gram: math.log((1 + len(rows)) / (1 + freq)) + 1 for gram, freq in doc_freq.items()}
+    default_idf = math.log(1 + len(rows)) + 1
+    postings = {}
+    for entry, doc in enumerate(grams):
+        for gram, weight in _weights(doc, idf, default_idf).items():
+            postings.setdefault(gram, []).append((entry, weight))
+    return {"rows": rows, "idf": idf, "default_idf": default_idf, "postings": postings}
+
+
+# Index is rebuilt only when the cache contents change
+def _get_index(db_path):
+    version = cache_version(db_path)
+    with _lock:
+        if _index["version"] != version:
+            _index.update(_build_index(cached_questions(db_path)), version=version)
+        return dict(_index)
+
+
+# Candidate (similarity, sql) pairs for the question, best first
+def similar_questions(db_path, question, deployment, threshold=SIMILARITY_THRESHOLD):
+    index = _get_index(db_path)
+    scores = Counter()
+    for gram, weight in _weights(char_ngrams(question), index["idf"], index["default_idf"]).items():
+        for entry, entry_weight in index["postings"].get(gram, []):
+            scores[entry] += weight * entry_weight
+    words = content_words(question)
+    matches = []
+    for entry, score in scores.most_common():
+        if score < threshold:
+            break
+        entry_question, entry_deployment, sql = index["rows"][entry]
+        if entry_deployment == (deployment or "") and content_words(entry_question) == words:
+            matches.append((score, sql))
+    return matches
+
+
+def explains_cleanly(con, sql):
+    try:
+        con.execute(f"EXPLAIN {sql}")
+        return True
+    except sqlite3.Error:
+        return False
+
+
+# Best previously generated SQL for a paraphrased question that still compiles against the schema
+def find_similar_sql(db_path, con, question, deployment, threshold=SIMILARITY_THRESHOLD):
+    for score, sql in similar_questions(db_path, question, deployment, threshold):
+        if explains_cleanly(con, sql):
+            return sql, score
+    return None, 0.0
@@ -0,0 +1,194 @@
+import logging
+import os
+
+import streamlit as st
+
+from chart_planner import chart_data
+from chart_service import CHART_TYPES, cached_chart
+from index_advisor import record_query
+from query_guard import QueryGuardError, run_cancellable
+from query_log import log_query, timed
+from question_match import find_similar_sql
+from result_export import FORMATS, available_formats, cached_export, export_file_name, export_mime, export_result, result_hash
+from result_pager import ResultPager
+from schema_context import build_schema_context
+from sql_cache import lookup_sql, store_sql
+from sql_extract import extract_sql
+from sql_validate import repair_messages, validate_sql
+
+# The question -> SQL -> results part of the Streamlit explorer apps (Test3,
+# test4): generate (cache, similar question or streamed LLM), validate and
+# repair, a guarded paged run, then the results, export and chart sections.
+
+# Schema context pruning: top-k relevant tables (plus FK neighbours) under a token budget
+SchemaTopK = int(os.getenv("SchemaTopK", "5"))
+SchemaTokenBudget = int(os.getenv("SchemaTokenBudget", "1500"))
+
+logger = logging.getLogger(__name__)
+
+
+# Database metadata relevant to the question
+def question_context(con, question):
+    return build_schema_context(con, question, top_k=SchemaTopK, token_budget=SchemaTokenBudget)
+
+
+# Answer one submitted question; the pager and SQL are kept in st.session_state
+# for show_results. app names the calling page in the query log.
+def ask_question(pool, llm, deployment, question, app):
+    # one structured query log entry per question (latency per stage in ms)
+    stages, sql_query, from_cache, source = {}, None, False, None
+    try:
+        with st.spinner("Generating SQL and fetching results..."):
+            with timed(stages, "lookup"), pool.reader() as con:
+                # Context Prompt with the live metadata pruned to this question
+                context = f"""Generate a SQL query ready to run on sqlite database based on this metadata:\n{question_context(con, question)}\nReturn ONLY SQL, no explanation."""
+                sql_text = lookup_sql(pool.path, question, context, deployment)
+                from_cache = sql_text is not None
+                source = "cache" if from_cache else None
+                similarity = 0.0
+                if not from_cache:
+                    sql_text, similarity = find_similar_sql(pool.path, con, question, deployment)
+                    source = "similar" if sql_text is not None else "llm"
+            if sql_text is None:
+                # stream tokens and stop as soon as the first SQL statement is complete
+                live_sql = st.empty()
+                with timed(stages, "generate"):
+                    sql_text = llm.generate_sql(
+                        deployment,
+                        [{"role": "system", "content": context}, {"role": "user", "content": question}],
+                        on_delta=lambda text: live_sql.code(text),
+                        temperature=0.5,
+                        max_tokens=1000,
+                    ).strip()
+                live_sql.empty()
+
+            sql_query = extract_sql(sql_text)
+            validation_error = first_error = None
+            if sql_query is not None:
+                with timed(stages, "validate"):
+                    # compile against the live schema (read-only) before running anything
+                    with pool.reader() as con:
+                        validation_error = first_error = validate_sql(con, sql_query)
+                    if validation_error:
+                        # one targeted repair round trip carrying the exact error
+                        logger.warning(f"SQL validation failed: {validation_error}")
+                        sql_query = extract_sql(llm.generate_sql(
+                            deployment,
+                            repair_messages(context, question, sql_query, validation_error),
+                            temperature=0,
+                            max_tokens=1000,
+                        ))
+                        with pool.reader() as con:
+                            validation_error = validate_sql(con, sql_query)
+                        logger.info(f"SQL repair {'failed' if validation_error else 'succeeded'}")
+
+            if sql_query is None:
+                st.warning("🤖 I couldn't understand your request as a SQL question. Please try rephrasing.")
+                logger.warning(f"Non-SQL response received: {sql_text}")
+                log_query(question, None, stages, cache_hit=from_cache, source=source, error="non-SQL response", app=app)
+            elif validation_error:
+                st.warning(f"🤖 The generated SQL doesn't fit this database ({validation_error}). Please try rephrasing.")
+                logger.warning(f"SQL rejected: {validation_error}")
+                log_query(question, sql_query, stages, cache_hit=from_cache, source=source, error=validation_error, app=app)
+            else:
+                # Paged, guarded run of the first page on a worker (read-only, time-limited).
+                # Any click (e.g. Cancel) reruns the script, which cancels the running query.
+                cancel_area = st.empty()
+                cancel_area.button("⏹ Cancel query")
+                query_status = st.empty()
+                if 'pager' in st.session_state:
+                    st.session_state['pager'].close()
+                    del st.session_state['pager']
+                pager = ResultPager(pool, sql_query)
+                with timed(stages, "execute"):
+                    run_cancellable(
+                        lambda cancel: pager.page(0, cancel),
+                        on_wait=lambda elapsed: query_status.caption(f"⏳ Running query... {elapsed:.0f}s"),
+                    )
+                cancel_area.empty()
+                query_status.empty()
+                record_query(pool.path, sql_query)
+                st.session_state['pager'] = pager
+                st.session_state['last_sql'] = sql_query
+
+                with st.expander("🧠 Generated SQL"):
+                    st.code(sql_query)
+                if first_error:
+                    st.caption(f"🛠️ Fixed after validation: {first_error}")
+                if from_cache and not first_error:
+                    st.caption("⚡ Answered from the question cache")
+                else:
+                    if similarity:
+                        st.caption(f"⚡ Reused SQL from a similar earlier question ({similarity:.0%} match)")
+                    store_sql(pool.path, question, context, deployment, sql_query)
+
+                # the pager keeps the count for the results below
+                with timed(stages, "count"):
+                    row_count = pager.total_rows()
+                log_query(question, sql_query, stages, row_count=row_count, cache_hit=from_cache and not first_error,
+                          source=source, app=app, result=lambda: pager.page(0))
+
+    except QueryGuardError as e:
+        logger.warning(f"Query guard: {e}")
+        log_query(question, sql_query, stages, cache_hit=from_cache, source=source, error=e, app=app)
+        st.warning(f"🛑 {e}")
+    except Exception as e:
+        logger.error(f"SQL processing error: {e}")
+        log_query(question, sql_query, stages, cache_hit=from_cache, source=source, error=e, app=app)
+        st.error(f"Something went wrong: {e}")
+
+
+# Results one page at a time, then the export and chart sections for the last query
+def show_results(pool):
+    # Results, one page at a time
+    if 'pager' in st.session_state:
+        pager = st.session_state['pager']
+        st.subheader("📋 Results")
+        pages = pager.page_count()
+        page = 1
+        if pages != 1:
+            page = st.number_input("Page", min_value=1, max_value=pages, value=1, step=1, key=f"page_{hash(pager.sql)}")
+        total = pager.total_rows()
+        st.caption(f"{total:,} rows" if total is not None else "Row count unavailable (counting timed out)")
+        if total is not None and total > pager.row_cap:
+            st.caption(f"Showing and exporting the first {pager.row_cap:,} rows.")
+        try:
+            st.dataframe(pager.page(page - 1), use_container_width=True)
+        except QueryGuardError as e:
+            st.warning(f"🛑 {e}")
+
+    # Export
+    if 'last_sql' in st.session_state:
+        # built only when asked for, streamed from the cursor and cached per result
+        export_format = st.selectbox("Export format", available_formats(), format_func=lambda fmt: FORMATS[fmt][0])
+        export_key = result_hash(pool, st.session_state['last_sql'])
+        export_data = cached_export(export_key, export_format)
+        if export_data is None and st.button("Prepare download"):
+            try:
+                export_data = export_result(pool, st.session_state['last_sql'], export_format, key=export_key)
+            except QueryGuardError as e:
+                st.warning(f"Export stopped: {e}")
+            except Exception as e:
+                logger.error(f"Export error ({export_format}): {e}")
+                st.error(f"Could not build the {FORMATS[export_format][0]} export: {e}")
+        if export_data is not None:
+            st.download_button(f"📥 Download {FORMATS[export_format][0]}", data=export_data, file_name=export_file_name("query_results", export_format), mime=export_mime(export_format))
+
+    # Visualization
+    if 'last_sql' in st.session_state:
+        st.subheader("📈 Visualization")
+
+        chart_type = st.selectbox("📊 Choose chart type", CHART_TYPES)
+
+        if chart_type != "None":
+            try:
+                # SQLite aggregates the result to a bounded number of points (chart_planner);
+                # drawn once per result and chart type, then served from cache
+                sql = st.session_state['last_sql']
+                chart = cached_chart(result_hash(pool, sql), chart_type, lambda: chart_data(pool, sql))
+                if chart is None:
+                    st.info("ℹ️ Please ensure your data has either 2 columns (Category + Value) or 3 columns (Category, Time, Value) to visualize.")
+                else:
+                    st.image(chart, use_container_width=True)
+            except Exception as e:
+                st.warning(f"⚠️ Could not render chart: {e}")
@@ -0,0 +1,66 @@
+import os
+
+import pandas as pd
+
+from bounded_cache import BoundedCache
+
+# Query result cache keyed on normalized SQL and a data token (PRAGMA
+# data_version, change counter, file mtimes); LRU under a memory cap.
+
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+CATEGORY_RATIO = 0.5
+
+_results = BoundedCache(max_bytes=MAX_CACHE_BYTES, size=lambda df: int(df.memory_usage(deep=True).sum()))
+stats = _results.stats
+
+
+def normalize_sql(sql):
+    return " ".join(sql.split()).rstrip(";").strip()
+
+
+def _file_token(path):
+    token = []
+    for suffix in ("", "-wal"):
+        try:
+            info = os.stat(path + suffix)
+            token.append((info.st_mtime_ns, info.st_size))
+        except OSError:
+            token.append(None)
+    return tuple(token)
+
+
+# Changes whenever this connection or any other writer commits to the database
+def data_token(con, db_path):
+    data_version = con.execute("PRAGMA data_version;").fetchone()[0]
+    return (data_version, con.total_changes, _file_token(db_path))
+
+
+# Low-cardinality text columns become categoricals; numbers are downcast
+def compact_frame(df):
+    compact = df.copy()
+    for col in compact.columns:
+        series = compact[col]
+        is_text = series.dtype == object or pd.api.types.is_string_dtype(series.dtype)
+        if is_text and len(series) and series.nunique(dropna=False) <= len(series) * CATEGORY_RATIO:
+            compact[col] = series.astype("category")
+        elif pd.api.types.is_integer_dtype(series):
+            compact[col] = pd.to_numeric(series, downcast="integer")
+        elif pd.api.types.is_float_dtype(series):
+            compact[col] = pd.to_numeric(series, downcast="float")
+    return compact
+
+
+# Run the query (or return the cached frame) for the current state of the database.
+# Pooled callers pass the pool's data_version as token, since per-connection
+# counters differ between pooled connections.
+def cached_query(con, db_path, sql, token=None):
+    if token is None:
+        token = data_token(con, db_path)
+    else:
+        token = (token, _file_token(db_path))
+
+    def run():
+        result = con.execute(sql)
+        return compact_frame(pd.DataFrame(result.fetchall(), columns=[desc[0] for desc in result.description]))
+
+    return _results.get_or_build((os.path.abspath(db_path), normalize_sql(sql), token), run)
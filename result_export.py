@@ -0,0 +1,191 @@
+import csv
+import gzip
+import hashlib
+import io
+import os
+
+import xlsxwriter
+
+from bounded_cache import BoundedCache
+from query_guard import ROW_CAP, time_limit
+from result_cache import _file_token, normalize_sql
+
+# Result downloads (csv, csv.gz, xlsx, Parquet) of at most QueryRowCap rows,
+# built on request by streaming the cursor in chunks, and kept per process by
+# result hash.
+
+EXPORT_CHUNK_ROWS = int(os.getenv("ExportChunkRows", "5000"))
+EXPORT_TIMEOUT = float(os.getenv("ExportTimeout", "120"))
+MAX_EXPORT_CACHE_BYTES = 128 * 1024 * 1024
+XLSX_MAX_ROWS = 1048575  # worksheet rows below the header
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export needs pyarrow
+    pa = None
+
+# format -> (label, file extension, mime type)
+FORMATS = {
+    "csv": ("CSV", "csv", "text/csv"),
+    "csv.gz": ("CSV (gzip)", "csv.gz", "application/gzip"),
+    "xlsx": ("Excel", "xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "parquet": ("Parquet", "parquet", "application/vnd.apache.parquet"),
+}
+
+_exports = BoundedCache(max_bytes=MAX_EXPORT_CACHE_BYTES, size=len)
+
+
+def available_formats():
+    return [fmt for fmt in FORMATS if fmt != "parquet" or pa is not None]
+
+
+# Identifies one query result: the database, the normalized SQL and the data version
+def result_hash(pool, sql):
+    token = (os.path.abspath(pool.path), normalize_sql(sql), pool.data_version(), _file_token(pool.path))
+    return hashlib.sha256(repr(token).encode("utf-8")).hexdigest()
+
+
+def _chunks(cursor, chunk_rows, row_cap):
+    remaining = row_cap
+    while remaining > 0:
+        rows = cursor.fetchmany(min(chunk_rows, remaining))
+        if not rows:
+            return
+        remaining -= len(rows)
+        yield rows
+
+
+def _write_csv(out, columns, chunks, compress):
+    raw = gzip.GzipFile(fileobj=out, mode="wb") if compress else out
+    text = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+    writer = csv.writer(text)
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows(rows)
+    text.flush()
+    text.detach()
+    if compress:
+        raw.close()
+
+
+def _cell(value):
+    return value.hex() if isinstance(value, bytes) else value
+
+
+def _write_xlsx(out, columns, chunks):
+    # constant_memory flushes each row to a temp file once the next one starts
+    workbook = xlsxwriter.Workbook(out, {"constant_memory": True, "strings_to_urls": False})
+    worksheet = workbook.add_worksheet("Results")
+    worksheet.write_row(0, 0, columns)
+    row_number = 0
+    for rows in chunks:
+        for row in rows:
+            if row_number >= XLSX_MAX_ROWS:
+                break
+            row_number += 1
+            worksheet.write_row(row_number, 0, [_cell(value) for value in row])
+    workbook.close()
+
+
+def _parquet_type(types):
+    # Arrow type that holds every Python value type seen in a column
+    types = types - {type(None)}
+    if types and types <= {int, bool}:
+        return pa.int64()
+    if types and types <= {int, bool, float}:
+        return pa.float64()
+    if types == {bytes}:
+        return pa.binary()
+    return pa.string()  # text, mixed, or only NULLs so far
+
+
+# Python value types each non-string Arrow column type holds exactly (by type name)
+_HOLDS = {"int64": {int, bool}, "double": {int, bool, float}, "binary": {bytes}}
+
+
+def _parquet_array(values, field_type):
+    if field_type == pa.string():
+        values = [None if v is None else v.hex() if isinstance(v, bytes) else str(v) for v in values]
+    elif field_type == pa.float64():
+        values = [None if v is None else float(v) for v in values]
+    return pa.array(values, type=field_type)
+
+
+class _WiderSchema(Exception):
+    def __init__(self, schema):
+        self.schema = schema
+
+
+# The schema comes from the first chunk (or schema); a later chunk with values the
+# schema cannot hold exactly (10.5 in an integer column, text in a numeric one)
+# raises _WiderSchema with the promoted schema, and the export is written again.
+def _write_parquet(out, columns, chunks, schema=None):
+    writer = None
+    for rows in chunks:
+        arrays = [list(values) for values in zip(*rows)]
+        types = [set(map(type, values)) for values in arrays]
+        if schema is None:
+            schema = pa.schema([(col, _parquet_type(seen)) for col, seen in zip(columns, types)])
+        widened = [
+            field if field.type == pa.string() or (seen - {type(None)}) <= _HOLDS[str(field.type)]
+            else field.with_type(_parquet_type(seen | _HOLDS[str(field.type)]))
+            for field, seen in zip(schema, types)
+        ]
+        if widened != list(schema):
+            raise _WiderSchema(pa.schema(widened))
+        if writer is None:
+            writer = pq.ParquetWriter(out, schema)
+        table = pa.Table.from_arrays(
+            [_parquet_array(values, field.type) for values, field in zip(arrays, schema)], schema=schema
+        )
+        writer.write_table(table)
+    if writer is None:
+        writer = pq.ParquetWriter(out, schema or pa.schema([(col, pa.string()) for col in columns]))
+    writer.close()
+
+
+# Stream the result of sql (its first row_cap rows) into the given format and return the bytes
+def encode_result(con, sql, fmt, chunk_rows=EXPORT_CHUNK_ROWS, timeout=EXPORT_TIMEOUT, row_cap=ROW_CAP):
+    if fmt not in available_formats():
+        raise ValueError(f"Unsupported export format: {fmt}")
+    schema = None
+    with time_limit(con, timeout):
+        while True:
+            out = io.BytesIO()
+            cursor = con.execute(sql.strip().rstrip(";"))
+            columns = [desc[0] for desc in cursor.description]
+            chunks = _chunks(cursor, chunk_rows, row_cap)
+            try:
+                if fmt in ("csv", "csv.gz"):
+                    _write_csv(out, columns, chunks, compress=fmt == "csv.gz")
+                elif fmt == "xlsx":
+                    _write_xlsx(out, columns, chunks)
+                else:
+                    _write_parquet(out, columns, chunks, schema)
+                return out.getvalue()
+            except _WiderSchema as wider:
+                schema = wider.schema  # each retry widens at least one column, so this ends
+            finally:
+                cursor.close()
+
+
+def cached_export(key, fmt):
+    return _exports.get((key, fmt))
+
+
+# Bytes of the export (built once per result hash and format)
+def export_result(pool, sql, fmt, key=None):
+    def build():
+        with pool.reader() as con:
+            return encode_result(con, sql, fmt)
+
+    return _exports.get_or_build((key or result_hash(pool, sql), fmt), build)
+
+
+def export_file_name(stem, fmt):
+    return f"{stem}.{FORMATS[fmt][1]}"
+
+
+def export_mime(fmt):
+    return FORMATS[fmt][2]
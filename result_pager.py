@@ -0,0 +1,69 @@
+import os
+
+import pandas as pd
+
+from query_guard import QUERY_TIMEOUT, ROW_CAP, QueryGuardError, check_plan, time_limit
+
+# Paged query results: each page is its own LIMIT/OFFSET query on a pooled
+# read-only connection, which is handed back (cursor closed, read transaction
+# ended) before the page is returned, so nothing stays open across reruns.
+# The total comes from a separate COUNT(*). Only the first row_cap rows
+# (QueryRowCap) can be paged to.
+
+PAGE_SIZE = int(os.getenv("ResultPageSize", "100"))
+
+
+class ResultPager:
+    def __init__(self, pool, sql, page_size=PAGE_SIZE, timeout=QUERY_TIMEOUT, row_cap=ROW_CAP):
+        self.pool = pool
+        self.sql = sql.strip().rstrip(";")
+        self.page_size = page_size
+        self.row_cap = row_cap
+        self.timeout = timeout
+        self.columns = []
+        self._checked = False
+        self._last_page = None
+        self._total = None
+
+    # Rows of page number (0-based) as a DataFrame
+    def page(self, number, cancel=None):
+        if self._last_page and self._last_page[0] == number:
+            return self._last_page[1]
+        offset = number * self.page_size
+        if offset >= self.row_cap and number:
+            raise QueryGuardError(f"Only the first {self.row_cap:,} rows can be shown. Try narrowing the query down.")
+        limit = min(self.page_size, self.row_cap - offset)
+        with self.pool.reader() as con:
+            if not self._checked:
+                check_plan(con, self.sql)
+                self._checked = True
+            with time_limit(con, self.timeout, cancel):
+                cursor = con.execute(f"SELECT * FROM ({self.sql}) LIMIT {int(limit)} OFFSET {int(offset)}")
+                try:
+                    self.columns = [desc[0] for desc in cursor.description]
+                    rows = cursor.fetchall()
+                finally:
+                    cursor.close()
+        frame = pd.DataFrame(rows, columns=self.columns)
+        self._last_page = (number, frame)
+        return frame
+
+    # Total rows of the result (None if counting ran past the time limit)
+    def total_rows(self):
+        if self._total is None:
+            with self.pool.reader() as con:
+                try:
+                    with time_limit(con, self.timeout):
+                        self._total = con.execute(f"SELECT COUNT(*) FROM ({self.sql})").fetchone()[0]
+                except QueryGuardError:
+                    return None
+        return self._total
+
+    # Pages within the row cap (None if the count timed out)
+    def page_count(self):
+        total = self.total_rows()
+        return None if total is None else max(1, -(-min(total, self.row_cap) // self.page_size))
+
+    # Drop the cached page (no connection is held between pages)
+    def close(self):
+        self._last_page = None
@@ -0,0 +1,95 @@
+import os
+import sqlite3
+import threading
+
+# Process-wide schema catalog, rebuilt when SQLite reports a schema change or
+# the upload path invalidates it.
+
+# bookkeeping tables kept by the app itself, never shown to the LLM
+INTERNAL_PREFIXES = ("sqlite_", "_ingest_", "_mv_")
+
+_lock = threading.Lock()
+_catalogs = {}
+
+
+def _db_key(con):
+    # main database file path; empty for :memory: connections
+    row = con.execute("PRAGMA database_list;").fetchone()
+    return row[2] or f"memory:{id(con)}"
+
+
+def _schema_version(con):
+    return con.execute("PRAGMA schema_version;").fetchone()[0]
+
+
+# Build the catalog: {table: [(column, type), ...]} plus declared foreign keys
+def build_schema_catalog(con):
+    cursor = con.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
+    tables = [row[0] for row in cursor.fetchall() if not row[0].startswith(INTERNAL_PREFIXES)]
+    columns = {}
+    foreign_keys = {}
+    for table in tables:
+        cursor.execute(f'PRAGMA table_info("{table}");')
+        columns[table] = [(col[1], col[2]) for col in cursor.fetchall()]
+        cursor.execute(f'PRAGMA foreign_key_list("{table}");')
+        foreign_keys[table] = [(fk[3], fk[2], fk[4]) for fk in cursor.fetchall()]
+    return {"tables": columns, "foreign_keys": foreign_keys}
+
+
+# Return the cached catalog, rebuilding it only when PRAGMA schema_version moved
+def get_schema_catalog(con):
+    key = _db_key(con)
+    version = _schema_version(con)
+    with _lock:
+        cached = _catalogs.get(key)
+        if cached and cached["schema_version"] == version:
+            return cached["catalog"]
+    catalog = build_schema_catalog(con)
+    with _lock:
+        _catalogs[key] = {"schema_version": version, "catalog": catalog}
+    return catalog
+
+
+# Drop cached catalogs (called by the Excel upload path after writing tables)
+def invalidate_schema_cache(con=None):
+    with _lock:
+        if con is None:
+            _catalogs.clear()
+        else:
+            _catalogs.pop(_db_key(con), None)
+
+
+# Render the catalog in the same "Table X: col (TYPE), ..." format used by the prompts
+def schema_to_text(catalog, tables=None):
+    table_info = ""
+    for table in (tables if tables is not None else catalog["tables"]):
+        columns = ", ".join([f"{name} ({col_type})" for name, col_type in catalog["tables"][table]])
+        table_info += f"Table {table}: {columns}\n"
+    return table_info
+
+
+# Catalog for a DDL metadata file (e.g. databaseMetaData.sql), loaded into an in-memory database.
+# Commented-out and malformed statements are skipped; cached until the file changes.
+_ddl_catalogs = {}
+
+
+def catalog_from_ddl(path):
+    mtime = os.path.getmtime(path)
+    with _lock:
+        cached = _ddl_catalogs.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1], cached[2]
+    with open(path, 'r') as file:
+        lines = [line for line in file.read().splitlines() if not line.strip().startswith("--")]
+    con = sqlite3.connect(":memory:", check_same_thread=False)
+    for statement in "\n".join(lines).replace('"""', "").split(";"):
+        if statement.strip().upper().startswith("CREATE TABLE"):
+            try:
+                con.execute(statement)
+            except sqlite3.Error:
+                continue
+    catalog = build_schema_catalog(con)
+    with _lock:
+        _ddl_catalogs[path] = (mtime, con, catalog)
+    return con, catalog
@@ -0,0 +1,159 @@
+import math
+import re
+import threading
+from collections import Counter
+
+from schema_cache import get_schema_catalog, schema_to_text
+
+# Relevance-pruned schema context.
+# Ranks tables against the user question with a small TF-IDF index built over
+# table names, column names and a few sample values, then renders only the
+# top-k tables plus their FK neighbours under a token budget.
+
+SAMPLE_VALUES_PER_COLUMN = 5
+SAMPLE_SCAN_ROWS = 1000
+TABLE_WEIGHT = 3
+COLUMN_WEIGHT = 2
+
+_lock = threading.Lock()
+_indexes = {}
+
+
+# Split identifiers / text into lowercase word tokens ("LoanAmount" -> loan, amount)
+def tokenize(text):
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", str(text))
+    tokens = []
+    for word in re.split(r"[^A-Za-z0-9]+", text.lower()):
+        if not word:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+# Distinct sample values from the first SAMPLE_SCAN_ROWS rows only, so a large
+# table is never scanned end to end to build the prompt
+def _sample_values(con, table, column):
+    try:
+        rows = con.execute(
+            f'SELECT DISTINCT "{column}" FROM (SELECT "{column}" FROM "{table}" WHERE "{column}" IS NOT NULL '
+            f'LIMIT {SAMPLE_SCAN_ROWS}) LIMIT {SAMPLE_VALUES_PER_COLUMN};'
+        ).fetchall()
+    except Exception:
+        return []
+    return [row[0] for row in rows if isinstance(row[0], str)]
+
+
+# Tables referenced by each table: declared foreign keys, plus (for uploaded sheets,
+# which have none) any *_id / *ID column that is the leading key column of another table
+def _neighbours(catalog):
+    neighbours = {table: set() for table in catalog["tables"]}
+    for table, fks in catalog["foreign_keys"].items():
+        for _, ref_table, _ in fks:
+            if ref_table in neighbours and ref_table != table:
+                neighbours[table].add(ref_table)
+    key_owners = {}
+    for table, columns in catalog["tables"].items():
+        if columns:
+            key = columns[0][0].lower().replace("_", "")
+            if key.endswith("id") and len(key) > 2:
+                key_owners.setdefault(key, table)
+    for table, columns in catalog["tables"].items():
+        for name, _ in columns[1:]:
+            owner = key_owners.get(name.lower().replace("_", ""))
+            if owner and owner != table:
+                neighbours[table].add(owner)
+    return neighbours
+
+
+def build_schema_index(con, catalog):
+    docs = {}
+    column_tokens = {}
+    for table, columns in catalog["tables"].items():
+        doc = Counter()
+        for token in tokenize(table):
+            doc[token] += TABLE_WEIGHT
+        column_tokens[table] = {}
+        for name, col_type in columns:
+            tokens = set(tokenize(name))
+            if "TEXT" in (col_type or "").upper() or "CHAR" in (col_type or "").upper():
+                for value in _sample_values(con, table, name):
+                    tokens.update(tokenize(value))
+            column_tokens[table][name] = tokens
+            for token in tokenize(name):
+                doc[token] += COLUMN_WEIGHT
+            for token in tokens:
+                doc[token] += 1
+        docs[table] = doc
+    doc_freq = Counter()
+    for doc in docs.values():
+        doc_freq.update(doc.keys())
+    idf = {token: math.log((1 + len(docs)) / (1 + freq)) + 1 for token, freq in doc_freq.items()}
+    return {"docs": docs, "columns": column_tokens, "idf": idf, "neighbours": _neighbours(catalog)}
+
+
+# Index is rebuilt together with the cached catalog (same object until schema_version moves)
+def get_schema_index(con, catalog=None):
+    catalog = catalog or get_schema_catalog(con)
+    key = id(catalog)
+    with _lock:
+        cached = _indexes.get(key)
+        if cached and cached[0] is catalog:
+            return cached[1]
+    index = build_schema_index(con, catalog)
+    with _lock:
+        _indexes.clear()
+        _indexes[key] = (catalog, index)
+    return index
+
+
+def rank_tables(question, index):
+    query = Counter(tokenize(question))
+    scores = {}
+    for table, doc in index["docs"].items():
+        total = sum(doc.values()) or 1
+        scores[table] = sum(
+            count * (doc[token] / total) * index["idf"].get(token, 0) for token, count in query.items() if token in doc
+        )
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+# Keep key columns and columns that matched the question; drop the rest
+def _trim_columns(catalog, index, table, question_tokens):
+    kept = []
+    for name, col_type in catalog["tables"][table]:
+        key = name.lower().replace("_", "")
+        if key.endswith("id") or index["columns"][table][name] & question_tokens:
+            kept.append((name, col_type))
+    return kept
+
+
+# Build the pruned "Table X: col (TYPE), ..." metadata string for one question
+def build_schema_context(con, question, top_k=5, token_budget=1500, catalog=None):
+    catalog = catalog or get_schema_catalog(con)
+    index = get_schema_index(con, catalog)
+    ranked = rank_tables(question, index)
+    selected = [table for table, score in ranked if score > 0][:top_k]
+    if not selected:
+        # nothing matched lexically, fall back to every table in rank order
+        selected = [table for table, _ in ranked]
+    for table in list(selected):
+        for neighbour in sorted(index["neighbours"][table]):
+            if neighbour not in selected:
+                selected.append(neighbour)
+
+    pruned = {"tables": {table: catalog["tables"][table] for table in selected}, "foreign_keys": {}}
+    question_tokens = set(tokenize(question))
+    # Over budget: first narrow the lowest-ranked tables to matching columns, then drop them
+    for table in reversed(selected):
+        if estimate_tokens(schema_to_text(pruned)) <= token_budget:
+            break
+        pruned["tables"][table] = _trim_columns(catalog, index, table, question_tokens)
+    while len(pruned["tables"]) > 1 and estimate_tokens(schema_to_text(pruned)) > token_budget:
+        pruned["tables"].pop(list(pruned["tables"])[-1])
+    return schema_to_text(pruned)
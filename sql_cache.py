@@ -0,0 +1,122 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# Persistent NL-question -> SQL cache.
+# Stored in its own SQLite file next to database.db so a repeated question
+# skips the Azure OpenAI round trip. Entries are keyed on the normalized
+# question, a hash of the schema context and the deployment name, and are
+# evicted by TTL and least-recent use.
+
+CACHE_FILE = "sql_cache.db"
+MAX_ENTRIES = 5000
+TTL_SECONDS = 7 * 24 * 3600
+
+_lock = threading.Lock()
+_connections = {}
+stats = {"hits": 0, "misses": 0}
+
+
+def cache_path_for(db_path):
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), CACHE_FILE)
+
+
+def _connect(path):
+    with _lock:
+        con = _connections.get(path)
+        if con is None:
+            con = sqlite3.connect(path, check_same_thread=False)
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS question_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    question TEXT,
+                    normalized_question TEXT,
+                    context_hash TEXT,
+                    deployment TEXT,
+                    sql TEXT,
+                    created_at REAL,
+                    last_used REAL,
+                    hits INTEGER DEFAULT 0
+                );
+            """)
+            con.execute("CREATE INDEX IF NOT EXISTS idx_question_cache_last_used ON question_cache(last_used);")
+            con.commit()
+            _connections[path] = con
+        return con
+
+
+# Lowercase, drop punctuation and collapse whitespace ("Total loans?" == "total  loans")
+def normalize_question(question):
+    text = re.sub(r"[^\w\s]", " ", question.lower())
+    return " ".join(text.split())
+
+
+def context_hash(context):
+    return hashlib.sha256(context.encode("utf-8")).hexdigest()
+
+
+def cache_key(question, context, deployment):
+    raw = "\0".join([normalize_question(question), context_hash(context), deployment or ""])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# Return cached SQL for the question or None; expired entries count as misses
+def lookup_sql(db_path, question, context, deployment, ttl_seconds=TTL_SECONDS):
+    con = _connect(cache_path_for(db_path))
+    key = cache_key(question, context, deployment)
+    now = time.time()
+    with _lock:
+        row = con.execute("SELECT sql, created_at FROM question_cache WHERE cache_key = ?;", (key,)).fetchone()
+        if row and now - row[1] <= ttl_seconds:
+            con.execute("UPDATE question_cache SET last_used = ?, hits = hits + 1 WHERE cache_key = ?;", (now, key))
+            con.commit()
+            stats["hits"] += 1
+            return row[0]
+        if row:
+            con.execute("DELETE FROM question_cache WHERE cache_key = ?;", (key,))
+            con.commit()
+        stats["misses"] += 1
+    return None
+
+
+# Store SQL that executed successfully, then evict expired and least recently used entries
+def store_sql(db_path, question, context, deployment, sql, max_entries=MAX_ENTRIES, ttl_seconds=TTL_SECONDS):
+    con = _connect(cache_path_for(db_path))
+    now = time.time()
+    with _lock:
+        con.execute(
+            "INSERT OR REPLACE INTO question_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0);",
+            (cache_key(question, context, deployment), question, normalize_question(question),
+             context_hash(context), deployment or "", sql, now, now),
+        )
+        con.execute("DELETE FROM question_cache WHERE created_at < ?;", (now - ttl_seconds,))
+        con.execute("""
+            DELETE FROM question_cache WHERE cache_key IN (
+                SELECT cache_key FROM question_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            );
+        """, (max_entries,))
+        con.commit()
+
+
+def cache_stats(db_path):
+    con = _connect(cache_path_for(db_path))
+    with _lock:
+        entries, total_hits = con.execute("SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM question_cache;").fetchone()
+    return {"hits": stats["hits"], "misses": stats["misses"], "entries": entries, "total_hits": total_hits}
+
+
+# Marker that changes whenever entries are added or evicted
+def cache_version(db_path):
+    con = _connect(cache_path_for(db_path))
+    with _lock:
+        return con.execute("SELECT COUNT(*), MAX(created_at), MIN(created_at) FROM question_cache;").fetchone()
+
+
+# All cached (normalized question, deployment, sql) rows
+def cached_questions(db_path):
+    con = _connect(cache_path_for(db_path))
+    with _lock:
+        return con.execute("SELECT normalized_question, deployment, sql FROM question_cache;").fetchall()
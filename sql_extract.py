@@ -0,0 +1,60 @@
+import re
+
+# SQL extraction from LLM output: the first SELECT / WITH statement of a
+# (possibly partial) answer and whether it is complete, i.e. ended by a ';' or,
+# inside a ``` block, by the closing fence (outside literals and comments).
+
+_START = re.compile(r"\bSELECT\b|\bWITH\s+(?:RECURSIVE\s+)?\w+\s*(?:\([^)]*\)\s*)?AS\s*\(", re.IGNORECASE)
+_LINE_START = re.compile(r"[ \t]*(?:```\w*[ \t]*)?")
+
+
+def _scan(text, start, fenced):
+    # end of the statement starting at start: (statement, complete), or None when
+    # an opening ``` fence comes first (the candidate was prose, not SQL)
+    i = start
+    quote = None
+    while i < len(text):
+        char = text[i]
+        if quote:
+            if text.startswith(quote, i):
+                i += len(quote) - 1
+                quote = None
+        elif char in ("'", '"', "`") and not text.startswith("```", i):
+            quote = char
+        elif text.startswith("--", i):
+            quote = "\n"
+        elif text.startswith("/*", i):
+            quote = "*/"
+            i += 1
+        elif char == ";":
+            return text[start:i + 1].strip(), True
+        elif text.startswith("```", i):
+            if not fenced:
+                return None
+            return text[start:i].strip().rstrip(";") + ";", True
+        i += 1
+    return text[start:].strip(), False
+
+
+# (statement, complete): statement is None when no SELECT/WITH has appeared yet.
+# A statement starts at the beginning of a line or right after an opening fence,
+# so "to select the totals" in prose is not taken for SQL.
+def first_statement(text):
+    for match in _START.finditer(text):
+        start = match.start()
+        if not _LINE_START.fullmatch(text, text.rfind("\n", 0, start) + 1, start):
+            continue
+        found = _scan(text, start, fenced=text.count("```", 0, start) % 2 == 1)
+        if found is not None:
+            return found
+    return None, False
+
+
+# Complete statement from a full answer (a missing final ';' is added), or None
+def extract_sql(text):
+    statement, complete = first_statement(text or "")
+    if statement is None:
+        return None
+    if not complete:
+        statement = statement.rstrip().rstrip(";") + ";"
+    return statement
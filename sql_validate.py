@@ -0,0 +1,78 @@
+import re
+import sqlite3
+
+from schema_cache import get_schema_catalog
+from sql_extract import first_statement
+
+# Local validation of generated SQL before it runs.
+# The statement is compiled with EXPLAIN under an authorizer that only allows
+# reads, so unknown tables / columns and anything that is not read-only are
+# rejected without executing it. Errors are made specific against the cached
+# schema (the columns a table really has) so a single repair prompt can fix them.
+
+READ_ONLY_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION}
+if hasattr(sqlite3, "SQLITE_RECURSIVE"):
+    READ_ONLY_ACTIONS.add(sqlite3.SQLITE_RECURSIVE)
+
+_NO_SUCH_COLUMN = re.compile(r"no such column: (?:(\w+)\.)?(.+)$")
+_NO_SUCH_TABLE = re.compile(r"no such table: (?:main\.)?(\w+)")
+
+
+def _read_only(action, *args):
+    return sqlite3.SQLITE_OK if action in READ_ONLY_ACTIONS else sqlite3.SQLITE_DENY
+
+
+def _table_of(sql, name):
+    # alias -> table, e.g. "FROM Loans L" / "JOIN Impairments AS i"
+    match = re.search(rf"\b(?:from|join)\s+\"?(\w+)\"?\s+(?:as\s+)?{re.escape(name)}\b", sql, re.IGNORECASE)
+    return match.group(1) if match else name
+
+
+# Add what the schema does have to a SQLite error message
+def explain_error(message, sql, catalog):
+    tables = {name.lower(): name for name in catalog["tables"]}
+    match = _NO_SUCH_COLUMN.search(message)
+    if match:
+        qualifier, column = match.groups()
+        table = tables.get(_table_of(sql, qualifier).lower()) if qualifier else None
+        if table:
+            columns = ", ".join(col for col, _ in catalog["tables"][table])
+            return f"{message}. Table {table} has columns: {columns}"
+        return f"{message}. Use only columns listed in the schema"
+    match = _NO_SUCH_TABLE.search(message)
+    if match:
+        return f"{message}. Available tables: {', '.join(catalog['tables'])}"
+    return message
+
+
+# None when the SQL is a single read-only statement that compiles against the
+# current schema, otherwise the error to show (and to send back to the model)
+def validate_sql(con, sql, catalog=None):
+    statement = (sql or "").strip()
+    if not statement:
+        return "No SQL query was generated"
+    if not re.match(r"(SELECT|WITH)\b", statement, re.IGNORECASE):
+        return "Only read-only SELECT queries are allowed"
+    if not sqlite3.complete_statement(statement) or first_statement(statement)[0] != statement:
+        return "Expected exactly one complete SQL statement ending with ';'"
+    con.set_authorizer(_read_only)
+    try:
+        con.execute(f"EXPLAIN {statement}")
+        return None
+    except sqlite3.DatabaseError as e:
+        error = str(e)
+    finally:
+        con.set_authorizer(None)
+    if "not authorized" in error:
+        return "Only read-only SELECT queries are allowed"
+    return explain_error(error, statement, catalog or get_schema_catalog(con))
+
+
+# Follow-up messages asking the model to fix one specific validation error
+def repair_messages(context, question, sql, error):
+    return [
+        {"role": "system", "content": context},
+        {"role": "user", "content": question},
+        {"role": "assistant", "content": sql},
+        {"role": "user", "content": f"That query fails on the database: {error}\nReturn ONLY the corrected SQL."},
+    ]
@@ -0,0 +1,50 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from bounded_cache import BoundedCache
+
+# Rating colours for the DORA tables: a vectorized CSS matrix per table, with
+# the Styler cached by data hash.
+
+# first matching rating wins
+RATING_STYLES = (
+    ("elite", "background-color: lightgreen"),
+    ("strong", "background-color: lightblue"),
+    ("low", "background-color: #f8d7da"),
+)
+MAX_CACHED_STYLES = 32
+
+_styles = BoundedCache(max_entries=MAX_CACHED_STYLES)
+
+
+def frame_hash(frame):
+    digest = hashlib.sha256(repr((list(frame.columns), list(frame.index))).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+# CSS per cell, same shape and labels as frame
+def css_matrix(frame, rules=RATING_STYLES):
+    css = {}
+    for position in range(frame.shape[1]):
+        text = frame.iloc[:, position].astype(str).str.lower()
+        css[position] = np.select(
+            [text.str.contains(word, regex=False).to_numpy(dtype=bool) for word, _ in rules],
+            [style for _, style in rules],
+            default="",
+        )
+    matrix = pd.DataFrame(css, index=frame.index)
+    matrix.columns = frame.columns
+    return matrix
+
+
+# Styler with the rating colours, built once per distinct table (callers that
+# already know what the table was built from can pass that as key)
+def rating_styler(frame, rules=RATING_STYLES, key=None):
+    def build():
+        css = css_matrix(frame, rules)
+        return frame.style.apply(lambda _: css, axis=None)
+
+    return _styles.get_or_build((key or frame_hash(frame), rules), build)
@@ -0,0 +1,105 @@
+import pandas as pd
+
+# Column type inference for uploaded sheets.
+# The conversion for each column is worked out once from a small sample and then
+# applied to whole columns in one vectorized pass (no per-row lambdas, no
+# exceptions driving control flow).
+
+SAMPLE_SIZE = 1000
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y")
+SERIAL_RANGE = (20000, 60000)  # likely Excel date serials
+EXCEL_ORIGIN = "1899-12-30"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _is_text(series):
+    return series.dtype == object or pd.api.types.is_string_dtype(series.dtype)
+
+
+# First format in DATE_FORMATS that parses every non-null sampled value, else None
+def detect_date_format(sample):
+    values = sample.dropna()
+    if values.empty or not values.map(lambda value: isinstance(value, str)).all():
+        return None
+    for fmt in DATE_FORMATS:
+        if pd.to_datetime(values, format=fmt, errors="coerce").notna().all():
+            return fmt
+    return None
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+# Kind of one column from its sample: datetime, serial, format:<fmt>, integer, real or text
+def infer_kind(sample, detect_dates=True):
+    values = sample.dropna()
+    if _is_text(values):
+        values = values[values.astype(str) != ""]
+    if values.empty:
+        return "text"
+    if pd.api.types.is_datetime64_any_dtype(values) or values.map(lambda value: hasattr(value, "year")).all():
+        return "datetime"
+    if pd.api.types.is_bool_dtype(values) or not values.map(_is_number).all():
+        fmt = detect_date_format(values) if detect_dates else None
+        return f"format:{fmt}" if fmt else "text"
+    numeric = values.astype(float)
+    if detect_dates and numeric.between(*SERIAL_RANGE).all():
+        return "serial"
+    if (numeric % 1 == 0).all():
+        return "integer"
+    return "real"
+
+
+def infer_kinds(df, sample_size=SAMPLE_SIZE, detect_dates=True):
+    sample = df.head(sample_size)
+    return {col: infer_kind(sample[col], detect_dates) for col in df.columns}
+
+
+# Whole-column conversion to datetime64; values that do not fit become NaT
+def to_datetime(series, kind):
+    if kind == "serial":
+        return pd.to_datetime(pd.to_numeric(series, errors="coerce"), unit="D", origin=EXCEL_ORIGIN)
+    if kind.startswith("format:"):
+        return pd.to_datetime(series, format=kind.split(":", 1)[1], errors="coerce")
+    return pd.to_datetime(series, errors="coerce")
+
+
+def _is_date_kind(kind):
+    return kind in ("datetime", "serial") or kind.startswith("format:")
+
+
+def sql_type(kind):
+    if _is_date_kind(kind):
+        return "TIMESTAMP"
+    return {"integer": "INTEGER", "real": "REAL"}.get(kind, "TEXT")
+
+
+# Apply the kinds to a chunk for SQLite: timestamps as text, integral numbers as int,
+# missing values as None; anything that does not fit its column's kind is kept as is
+def apply_kinds(df, kinds):
+    out = df.astype(object)
+    for col, kind in kinds.items():
+        series = df[col]
+        if _is_date_kind(kind):
+            converted = to_datetime(series, kind).dt.strftime(TIMESTAMP_FORMAT)
+            out[col] = converted.astype(object).where(converted.notna(), out[col])
+        elif kind == "integer":
+            numeric = pd.to_numeric(series, errors="coerce")
+            fits = numeric.notna() & (numeric % 1 == 0)
+            out[col] = numeric.where(fits).astype("Int64").astype(object).where(fits, out[col])
+    return out.where(df.notna(), None)
+
+
+# Detect date columns (Excel serials or string dates) and convert them in place.
+# A column is only converted when every non-null value fits, as before.
+def convert_possible_dates(df, sample_size=SAMPLE_SIZE):
+    for col, kind in infer_kinds(df, sample_size).items():
+        if not (kind == "serial" or kind.startswith("format:")):
+            continue
+        if kind == "serial" and not pd.to_numeric(df[col], errors="coerce").between(*SERIAL_RANGE).all():
+            continue
+        converted = to_datetime(df[col], kind)
+        if converted[df[col].notna()].notna().all():
+            df[col] = converted
+    return df
@@ -0,0 +1,84 @@
+import os
+import re
+import sqlite3
+import sys
+from collections import Counter
+
+from query_log import QUERY_LOG_PATH, read_query_log
+from sql_validate import validate_sql
+
+# Replay the query history in app.log (older runs) and the structured query
+# log through the local validation stage.
+#   python validation_report.py [app.log] [database.db] [query_log.db]
+# Reports how many logged execution failures were identifier / read-only errors
+# that validation now catches before execution, how the logged SQL fares against
+# the current schema, and the repair success rate once validation is logged.
+
+_RECORD_START = re.compile(r"^(?:[A-Z]+:[\w.]+:|\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d+ - [A-Z]+ - )")
+_GENERATED = re.compile(r"Generated SQL(?: query)?: (.*)$")
+_FAILED = re.compile(r"(?:SQL execution error|SQL processing error): (.*)$")
+_CATCHABLE = ("no such column", "no such table", "syntax error", "not authorized", "ambiguous column")
+
+
+# Log records as single strings (continuation lines joined to their record)
+def read_records(path):
+    records = []
+    with open(path, encoding="utf-8", errors="replace") as log:
+        for line in log:
+            line = line.rstrip("\n")
+            if _RECORD_START.match(line) or not records:
+                records.append(line)
+            else:
+                records[-1] += "\n" + line
+    return records
+
+
+def _generated_sql(record):
+    first, _, rest = record.partition("\n")
+    match = _GENERATED.search(first)
+    return (match.group(1) + "\n" + rest).strip() if match else None
+
+
+def _category(error):
+    return error.split(":")[0].split(".")[0].strip()
+
+
+def build_report(log_path, db_path, query_log_path=QUERY_LOG_PATH):
+    records = read_records(log_path) if os.path.exists(log_path) else []
+    entries = read_query_log(query_log_path)
+    generated = [sql for sql in map(_generated_sql, records) if sql] + [e["sql"] for e in entries if e["sql"]]
+    failures = [m.group(1) for r in records if (m := _FAILED.search(r.split("\n")[0]))]
+    failures += [e["error"] for e in entries if e["error"] and e["stages"] and "execute" in e["stages"]]
+    catchable = [error for error in failures if any(marker in error for marker in _CATCHABLE)]
+
+    con = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    replay = Counter()
+    for sql in generated:
+        error = validate_sql(con, sql)
+        replay[_category(error) if error else "valid"] += 1
+    con.close()
+
+    repairs = Counter(r.split("SQL repair ")[1].split()[0] for r in records if "SQL repair " in r)
+    return {
+        "generated": len(generated),
+        "execution_failures": len(failures),
+        "caught_before_execution": len(catchable),
+        "replay": dict(replay),
+        "repairs": dict(repairs),
+    }
+
+
+if __name__ == "__main__":
+    log_path = sys.argv[1] if len(sys.argv) > 1 else "app.log"
+    db_path = sys.argv[2] if len(sys.argv) > 2 else "database.db"
+    query_log_path = sys.argv[3] if len(sys.argv) > 3 else QUERY_LOG_PATH
+    report = build_report(log_path, db_path, query_log_path)
+    print(f"Generated SQL statements in log: {report['generated']}")
+    print(f"Logged execution failures:       {report['execution_failures']}")
+    print(f"  caught by local validation:    {report['caught_before_execution']}")
+    print("Logged SQL against the current schema:")
+    for outcome, count in sorted(report["replay"].items(), key=lambda item: -item[1]):
+        print(f"  {outcome}: {count}")
+    if report["repairs"]:
+        total = sum(report["repairs"].values())
+        print(f"Repair prompts: {total} ({report['repairs'].get('succeeded', 0)} succeeded)")